@@ -0,0 +1,93 @@
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import aiohttp
+from aiogram.types import Update
+
+from bench.latency_stats import LatencyStats
+from bot.bot import Bot
+
+logger = logging.getLogger(__name__)
+
+_update_ids = itertools.count(1)
+
+
+class ChatSimulator:
+    """Пользователь в нагрузочном тесте: /start → кнопки → услуга → пример → заявка → согласие.
+
+    Апдейты подаются в бота напрямую (Bot.feed_update), время шага — полная обработка апдейта.
+    Кнопки берутся из последней клавиатуры чата в заглушке Telegram.
+    """
+
+    def __init__(
+        self, bot: Bot, session: aiohttp.ClientSession, fakes_url: str,
+        stats: LatencyStats, think_time: float,
+    ) -> None:
+        self._bot = bot
+        self._session = session
+        self._fakes_url = fakes_url
+        self._stats = stats
+        self._think_time = think_time
+
+    async def run(self, chat_id: int) -> None:
+        service = f"Услуга {random.randint(1, 3)}"
+        steps: list[tuple[str, Callable[[], Awaitable[None]]]] = [
+            ("start", lambda: self._send_text(chat_id, "/start")),
+            ("buttons", lambda: self._press(chat_id, "Услуги и цены")),
+            ("service", lambda: self._press(chat_id, service)),
+            ("examples", lambda: self._press(chat_id, "Показать пример")),
+            ("consent", lambda: self._send_text(chat_id, "Хочу оставить заявку")),
+            ("order", lambda: self._press(chat_id, "Согласен")),
+        ]
+        for name, step in steps:
+            started = time.monotonic()
+            try:
+                await step()
+            except Exception:
+                logger.warning("chat_id=%s — ошибка на шаге %s", chat_id, name, exc_info=True)
+                self._stats.error(name)
+                return
+            self._stats.add(name, time.monotonic() - started)
+            if self._think_time:
+                await asyncio.sleep(random.uniform(0, 2 * self._think_time))
+
+    async def _send_text(self, chat_id: int, text: str) -> None:
+        await self._bot.feed_update(Update.model_validate({
+            "update_id": next(_update_ids),
+            "message": {**self._message(chat_id, next(_update_ids)), "from": self._user(chat_id), "text": text},
+        }))
+
+    async def _press(self, chat_id: int, label: str) -> None:
+        async with self._session.get(f"{self._fakes_url}/bench/chats/{chat_id}") as response:
+            keyboard = await response.json()
+        buttons = [b for row in keyboard.get("reply_markup", {}).get("inline_keyboard", []) for b in row]
+        button = next((b for b in buttons if label in b["text"]), None)
+        if button is None:
+            raise RuntimeError(f"Нет кнопки «{label}»: {[b['text'] for b in buttons]}")
+        await self._bot.feed_update(Update.model_validate({
+            "update_id": next(_update_ids),
+            "callback_query": {
+                "id": str(next(_update_ids)),
+                "from": self._user(chat_id),
+                "chat_instance": str(chat_id),
+                "data": button["callback_data"],
+                "message": {**self._message(chat_id, keyboard["message_id"]), "text": "…"},
+            },
+        }))
+
+    @staticmethod
+    def _user(chat_id: int) -> dict[str, Any]:
+        return {"id": chat_id, "is_bot": False, "first_name": "Bench", "username": f"bench{chat_id}"}
+
+    @staticmethod
+    def _message(chat_id: int, message_id: int) -> dict[str, Any]:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "username": f"bench{chat_id}"},
+        }
@@ -0,0 +1,151 @@
+import asyncio
+import io
+from typing import Any
+
+from aiohttp import web
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Минимальный PNG 1×1 — если Pillow не установлен
+_TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+_GOOGLE_DOC = "application/vnd.google-apps.document"
+_MODIFIED_TIME = "2026-01-01T00:00:00.000Z"
+
+SERVICES_SHEET_ID = "bench-services"
+ORDERS_SHEET_ID = "bench-orders"
+PROMPT_DOC_ID = "bench-prompt"
+BEST_FOLDER_ID = "bench-folder-best"
+GREETING_FILE_ID = "bench-greeting"
+CONSENT_FILE_IDS = ("bench-consent-data", "bench-consent-ads")
+
+PROMPT_TEXT = "Ты — ассистент нейро-креатора. Отвечай кратко и предлагай кнопки."
+
+
+class FakeGoogle:
+    """Заглушка Google API: OAuth-токен, Sheets (услуги, заявки), Drive (папки, файлы), экспорт Docs.
+
+    Пути — <host>/<path>, как их формирует GoogleApiRedirectAdapter бота.
+    """
+
+    def __init__(self, services: int, images_per_folder: int, image_side: int, latency: float) -> None:
+        self._latency = latency
+        self._files: dict[str, dict[str, Any]] = {}
+        self._content: dict[str, bytes] = {}
+        self._children: dict[str, list[str]] = {}
+        self.orders_written = 0
+        self._services: list[list[str]] = [["Название", "Описание", "Цена", "Сроки", "Пример (ссылка)"]]
+
+        image = self._make_image(image_side)
+        for i in range(1, services + 1):
+            folder_id = f"bench-folder-{i}"
+            self._add_folder(folder_id, f"Описание услуги {i}: пример работы.", image, images_per_folder)
+            self._services.append([
+                f"Услуга {i}", f"Описание услуги {i}", f"{i * 1000} ₽", f"{i} дн.",
+                f"https://drive.google.com/drive/folders/{folder_id}",
+            ])
+        self._add_folder(BEST_FOLDER_ID, "Лучшие работы.", image, images_per_folder)
+        self._add_file(GREETING_FILE_ID, "greeting.png", "image/png", image)
+        for file_id in CONSENT_FILE_IDS:
+            self._add_file(file_id, f"{file_id}.pdf", "application/pdf", b"%PDF-1.4\n% bench\n" + b"0" * 50_000)
+        self._add_file(SERVICES_SHEET_ID, "services", "application/vnd.google-apps.spreadsheet", b"")
+        self._add_file(PROMPT_DOC_ID, "prompt", _GOOGLE_DOC, PROMPT_TEXT.encode())
+
+    def register(self, app: web.Application, prefix: str) -> None:
+        app.router.add_post(f"{prefix}/token", self._on_token)
+        sheets = f"{prefix}/sheets.googleapis.com/v4/spreadsheets/{{sheet_id}}"
+        app.router.add_get(sheets, self._on_spreadsheet)
+        app.router.add_get(f"{sheets}/values/{{range}}", self._on_values_get)
+        app.router.add_post(f"{sheets}/values/{{range}}", self._on_values_append)
+        drive = f"{prefix}/www.googleapis.com/drive/v3/files"
+        app.router.add_get(drive, self._on_drive_list)
+        app.router.add_get(f"{drive}/{{file_id}}", self._on_drive_file)
+        app.router.add_get(f"{prefix}/docs.google.com/document/d/{{doc_id}}/export", self._on_doc_export)
+
+    @staticmethod
+    def _make_image(side: int) -> bytes:
+        if Image is None:
+            return _TINY_PNG
+        # Градиент — «тяжёлый» PNG примерно как реальные картинки-примеры
+        image = Image.linear_gradient("L").resize((side, side * 3 // 4)).convert("RGB")
+        out = io.BytesIO()
+        image.save(out, "PNG")
+        return out.getvalue()
+
+    def _add_file(self, file_id: str, name: str, mime_type: str, data: bytes) -> None:
+        self._files[file_id] = {
+            "id": file_id, "name": name, "mimeType": mime_type,
+            "md5Checksum": f"md5-{file_id}", "modifiedTime": _MODIFIED_TIME,
+        }
+        self._content[file_id] = data
+
+    def _add_folder(self, folder_id: str, description: str, image: bytes, images: int) -> None:
+        doc_id = f"{folder_id}-doc"
+        self._add_file(doc_id, "description", _GOOGLE_DOC, description.encode())
+        children = [doc_id]
+        for k in range(images):
+            image_id = f"{folder_id}-img-{k}"
+            self._add_file(image_id, f"{k:02d}.png", "image/png", image)
+            children.append(image_id)
+        self._children[folder_id] = children
+
+    async def _delay(self) -> None:
+        if self._latency:
+            await asyncio.sleep(self._latency)
+
+    async def _on_token(self, request: web.Request) -> web.Response:
+        return web.json_response({"access_token": "bench-token", "expires_in": 3600, "token_type": "Bearer"})
+
+    async def _on_spreadsheet(self, request: web.Request) -> web.Response:
+        await self._delay()
+        sheet_id = request.match_info["sheet_id"]
+        return web.json_response({
+            "spreadsheetId": sheet_id,
+            "properties": {"title": sheet_id},
+            "sheets": [{"properties": {
+                "sheetId": 0, "title": "Sheet1", "index": 0, "sheetType": "GRID",
+                "gridProperties": {"rowCount": 1000, "columnCount": 26},
+            }}],
+        })
+
+    async def _on_values_get(self, request: web.Request) -> web.Response:
+        await self._delay()
+        values = self._services if request.match_info["sheet_id"] == SERVICES_SHEET_ID else []
+        return web.json_response({"range": request.match_info["range"], "majorDimension": "ROWS", "values": values})
+
+    async def _on_values_append(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = await request.json()
+        rows = len(body.get("values", []))
+        self.orders_written += rows
+        return web.json_response({"spreadsheetId": request.match_info["sheet_id"], "updates": {"updatedRows": rows}})
+
+    async def _on_drive_list(self, request: web.Request) -> web.Response:
+        await self._delay()
+        # q='<folder_id>' in parents
+        folder_id = request.query.get("q", "").split("'")[1:2]
+        children = self._children.get(folder_id[0], []) if folder_id else []
+        return web.json_response({"files": [self._files[c] for c in children]})
+
+    async def _on_drive_file(self, request: web.Request) -> web.Response:
+        await self._delay()
+        file_id = request.match_info["file_id"]
+        if file_id not in self._files:
+            return web.json_response({"error": {"code": 404}}, status=404)
+        if request.query.get("alt") == "media":
+            return web.Response(body=self._content[file_id], content_type=self._files[file_id]["mimeType"])
+        return web.json_response(self._files[file_id])
+
+    async def _on_doc_export(self, request: web.Request) -> web.Response:
+        await self._delay()
+        doc_id = request.match_info["doc_id"]
+        return web.Response(body=self._content.get(doc_id, b""), content_type="text/plain")
+
+    def stats(self) -> dict[str, Any]:
+        return {"orders_written": self.orders_written}
+
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any
+
+from aiohttp import web
+
+
+class FakeLLM:
+    """Заглушка OpenAI-совместимого /chat/completions: сценарные ответы с заданной задержкой.
+
+    Ответ выбирается по последнему сообщению пользователя и ведёт бота по сценарию
+    нагрузочного теста: приветствие → услуги → пример → заявка.
+    """
+
+    def __init__(self, latency: float, jitter: float, chunk_delay: float) -> None:
+        self._latency = latency
+        self._jitter = jitter
+        self._chunk_delay = chunk_delay
+        self.requests = 0
+
+    def register(self, app: web.Application, prefix: str) -> None:
+        app.router.add_post(f"{prefix}/chat/completions", self._on_completions)
+
+    @staticmethod
+    def answer(messages: list[dict[str, Any]]) -> str:
+        user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        if isinstance(user, list):
+            user = " ".join(part.get("text", "") for part in user)
+        text = user.lower()
+        if text == "начать":
+            return (
+                "Здравствуйте! Я помогу выбрать услугу.\n\n"
+                "[buttons]\nУслуги и цены\nПримеры работ\n[/buttons]"
+            )
+        if text == "услуги и цены":
+            return (
+                "Вот что мы делаем:\n— Услуга 1\n— Услуга 2\n— Услуга 3\n\n"
+                "[buttons]\nУслуга 1\nУслуга 2\nУслуга 3\n[/buttons]"
+            )
+        if text.startswith("услуга "):
+            return (
+                f"{user}: подробное описание, цена и сроки.\n\n"
+                "[buttons]\nПоказать пример\nОставить заявку\n[/buttons]"
+            )
+        if "заявк" in text:
+            return (
+                "Заявка принята, мы свяжемся с вами!\n\n"
+                "[order]\nИмя: Тест\nУслуга: Услуга 1\nПочта: bench@example.com\nКомментарий: нагрузочный тест\n[/order]"
+            )
+        if "краткое содержание" in text or "сводк" in text:
+            return "Клиент интересовался услугами и примерами."
+        return "Пример работы по вашему запросу.\n\n[buttons]\nОставить заявку\n[/buttons]"
+
+    async def _on_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        text = self.answer(body.get("messages", []))
+        usage = {"prompt_tokens": 800, "completion_tokens": len(text) // 3, "total_tokens": 800 + len(text) // 3}
+        await asyncio.sleep(max(0.0, random.gauss(self._latency, self._jitter)))
+
+        created = int(time.time())
+        base = {"id": f"bench-{self.requests}", "created": created, "model": body.get("model", "")}
+        if not body.get("stream"):
+            return web.json_response({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+        final = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        return {"llm_requests": self.requests}
@@ -0,0 +1,76 @@
+"""Все заглушки внешних сервисов в одном aiohttp-приложении (отдельный процесс нагрузочного теста).
+
+Префиксы: /telegram — Bot API, /llm/v1 — OpenAI-совместимый API, /google — Google API.
+Запуск вручную: python -m bench.fake_servers --port 8900
+"""
+
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+from multiprocessing.synchronize import Event
+from typing import Any
+
+from aiohttp import web
+
+from bench.fake_google import FakeGoogle
+from bench.fake_llm import FakeLLM
+from bench.fake_telegram import FakeTelegram
+
+
+@dataclass(frozen=True)
+class FakeOptions:
+    port: int = 8900
+    llm_latency: float = 0.5
+    llm_jitter: float = 0.1
+    llm_chunk_delay: float = 0.01
+    telegram_latency: float = 0.02
+    google_latency: float = 0.05
+    services: int = 10
+    images_per_folder: int = 4
+    image_side: int = 2400
+
+
+def build_app(options: FakeOptions) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    telegram = FakeTelegram(options.telegram_latency)
+    llm = FakeLLM(options.llm_latency, options.llm_jitter, options.llm_chunk_delay)
+    google = FakeGoogle(options.services, options.images_per_folder, options.image_side, options.google_latency)
+    telegram.register(app, "/telegram")
+    llm.register(app, "/llm/v1")
+    google.register(app, "/google")
+
+    async def on_stats(request: web.Request) -> web.Response:
+        stats: dict[str, Any] = {**telegram.stats(), **llm.stats(), **google.stats()}
+        return web.json_response(stats)
+
+    app.router.add_get("/bench/stats", on_stats)
+    return app
+
+
+def serve(options: FakeOptions, ready: Event | None = None) -> None:
+    async def run() -> None:
+        runner = web.AppRunner(build_app(options), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", options.port, backlog=4096).start()
+        if ready is not None:
+            ready.set()
+        await asyncio.Event().wait()
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заглушки Telegram, LLM и Google для нагрузочного теста")
+    parser.add_argument("--port", type=int, default=FakeOptions.port)
+    parser.add_argument("--llm-latency", type=float, default=FakeOptions.llm_latency)
+    args = parser.parse_args()
+    serve(FakeOptions(port=args.port, llm_latency=args.llm_latency))
+
+
+if __name__ == "__main__":
+    main()
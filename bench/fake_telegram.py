@@ -0,0 +1,83 @@
+import asyncio
+import itertools
+import json
+import time
+from typing import Any
+
+from aiohttp import web
+
+
+class FakeTelegram:
+    """Заглушка Bot API: принимает исходящие запросы бота и запоминает клавиатуры по чатам.
+
+    Клиент нагрузочного теста читает последнюю клавиатуру чата через /bench/chats/<id>,
+    как пользователь видит её в приложении.
+    """
+
+    def __init__(self, latency: float) -> None:
+        self._latency = latency
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._keyboards: dict[int, dict[str, Any]] = {}
+        self.requests: dict[str, int] = {}
+        self.upload_bytes = 0
+
+    def register(self, app: web.Application, prefix: str) -> None:
+        app.router.add_post(f"{prefix}/bot{{token}}/{{method}}", self._on_method)
+        app.router.add_get("/bench/chats/{chat_id}", self._on_chat)
+
+    async def _on_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.requests[method] = self.requests.get(method, 0) + 1
+        fields: dict[str, Any] = {}
+        if request.can_read_body:
+            form = await request.post()
+            for key, value in form.items():
+                if isinstance(value, web.FileField):
+                    self.upload_bytes += len(value.file.read())
+                else:
+                    fields[key] = value
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        return web.json_response({"ok": True, "result": self._result(method, fields)})
+
+    def _result(self, method: str, fields: dict[str, Any]) -> Any:
+        chat_id = int(fields["chat_id"]) if "chat_id" in fields else 0
+        if method == "sendMediaGroup":
+            media = json.loads(fields.get("media", "[]"))
+            return [self._message(chat_id, {"photo": self._photo()}) for _ in media]
+        extra: dict[str, Any] = {}
+        if method == "sendPhoto":
+            extra["photo"] = self._photo()
+        elif method == "sendDocument":
+            extra["document"] = {"file_id": f"doc-{next(self._file_ids)}", "file_unique_id": "u"}
+        elif method in ("sendMessage", "editMessageText"):
+            extra["text"] = fields.get("text", "")
+        else:
+            return True
+        if "caption" in fields:
+            extra["caption"] = fields["caption"]
+        message_id = int(fields["message_id"]) if "message_id" in fields else None
+        message = self._message(chat_id, extra, message_id)
+        if "reply_markup" in fields:
+            markup = json.loads(fields["reply_markup"])
+            message["reply_markup"] = markup
+            self._keyboards[chat_id] = {"message_id": message["message_id"], "reply_markup": markup}
+        return message
+
+    def _message(self, chat_id: int, extra: dict[str, Any], message_id: int | None = None) -> dict[str, Any]:
+        return {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **extra,
+        }
+
+    def _photo(self) -> list[dict[str, Any]]:
+        return [{"file_id": f"photo-{next(self._file_ids)}", "file_unique_id": "u", "width": 1280, "height": 960}]
+
+    async def _on_chat(self, request: web.Request) -> web.Response:
+        return web.json_response(self._keyboards.get(int(request.match_info["chat_id"]), {}))
+
+    def stats(self) -> dict[str, Any]:
+        return {"telegram_requests": dict(self.requests), "telegram_upload_bytes": self.upload_bytes}
@@ -0,0 +1,40 @@
+import math
+
+
+class LatencyStats:
+    """Задержки по шагам сценария и ошибки; перцентили — по полной выборке."""
+
+    def __init__(self) -> None:
+        self._samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def add(self, step: str, seconds: float) -> None:
+        self._samples.setdefault(step, []).append(seconds)
+
+    def error(self, step: str) -> None:
+        self.errors[step] = self.errors.get(step, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(len(s) for s in self._samples.values())
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        result: dict[str, dict[str, float]] = {}
+        for step, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[step] = {
+                "count": len(ordered),
+                "errors": self.errors.get(step, 0),
+                "p50": self.percentile(ordered, 0.50),
+                "p95": self.percentile(ordered, 0.95),
+                "p99": self.percentile(ordered, 0.99),
+                "max": ordered[-1],
+            }
+        return result
+
+    @staticmethod
+    def percentile(ordered: list[float], q: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from bench.latency_stats import LatencyStats
+
+
+class LoopLagProbe:
+    """Задержка event loop: насколько позже заданного просыпается asyncio.sleep(interval)."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self._interval = interval
+        self._samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def summary(self) -> dict[str, float]:
+        ordered = sorted(self._samples)
+        return {
+            "p50": LatencyStats.percentile(ordered, 0.50),
+            "p99": LatencyStats.percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self._interval)
+            self._samples.append(max(0.0, time.monotonic() - started - self._interval))
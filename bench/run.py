@@ -0,0 +1,234 @@
+"""Нагрузочный тест бота на локальных заглушках Telegram, LLM и Google.
+
+Запуск: make bench  или  uv run python -m bench.run --chats 2000
+Сравнение с эталоном: --save base.json, затем --baseline base.json (код выхода 1 при регрессии p95).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from bench.fake_google import (
+    BEST_FOLDER_ID,
+    CONSENT_FILE_IDS,
+    GREETING_FILE_ID,
+    ORDERS_SHEET_ID,
+    PROMPT_DOC_ID,
+    SERVICES_SHEET_ID,
+)
+from bench.fake_servers import FakeOptions, serve
+from bench.latency_stats import LatencyStats
+from bench.loop_lag_probe import LoopLagProbe
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальных заглушках")
+    parser.add_argument("--chats", type=int, default=1000, help="число пользователей")
+    parser.add_argument("--concurrency", type=int, default=0, help="одновременных пользователей (0 — все)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза между шагами, сек")
+    parser.add_argument("--llm-latency", type=float, default=FakeOptions.llm_latency)
+    parser.add_argument("--llm-chunk-delay", type=float, default=FakeOptions.llm_chunk_delay)
+    parser.add_argument("--google-latency", type=float, default=FakeOptions.google_latency)
+    parser.add_argument("--telegram-latency", type=float, default=FakeOptions.telegram_latency)
+    parser.add_argument("--no-stream", action="store_true", help="без потоковых ответов LLM")
+    parser.add_argument("--state-backend", choices=("memory", "sqlite"), default="sqlite")
+    parser.add_argument("--telegram-rate", type=float, default=100_000,
+                        help="общий лимит исходящих в секунду (реальный Telegram — 30)")
+    parser.add_argument("--port", type=int, default=FakeOptions.port)
+    parser.add_argument("--save", type=Path, help="сохранить результат в JSON")
+    parser.add_argument("--baseline", type=Path, help="сравнить p95 шагов с сохранённым результатом")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост p95 относительно эталона")
+    return parser.parse_args()
+
+
+def service_account_info(token_uri: str) -> dict[str, str]:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    ).decode()
+    return {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": token_uri,
+        # Не из googleapis.com: google-auth не ходит за regional access boundary в настоящий IAM
+        "universe_domain": "bench.local",
+    }
+
+
+def configure_env(args: argparse.Namespace, fakes_url: str, data_dir: str) -> None:
+    """Переменные окружения бота: все внешние адреса — на заглушки."""
+    drive = "https://drive.google.com"
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:bench",
+        "TELEGRAM_API_URL": f"{fakes_url}/telegram",
+        "OPENROUTER_API_KEY": "bench",
+        "LLM_MODEL": "bench-model",
+        "LLM_BASE_URL": f"{fakes_url}/llm/v1",
+        "LLM_STREAMING": "false" if args.no_stream else "true",
+        "LLM_FALLBACK_MODELS": "",
+        "GOOGLE_API_BASE_URL": f"{fakes_url}/google",
+        "GOOGLE_SERVICE_ACCOUNT_JSON": json.dumps(service_account_info(f"{fakes_url}/google/token")),
+        "GOOGLE_SHEETS_SERVICES_URL": f"https://docs.google.com/spreadsheets/d/{SERVICES_SHEET_ID}/edit",
+        "GOOGLE_SHEETS_ORDERS_URL": f"https://docs.google.com/spreadsheets/d/{ORDERS_SHEET_ID}/edit",
+        "GOOGLE_DOC_PROMPT_URL": f"https://docs.google.com/document/d/{PROMPT_DOC_ID}/edit",
+        "BEST_EXAMPLE_URL": f"{drive}/drive/folders/{BEST_FOLDER_ID}",
+        "GREETING_IMAGE_URL": f"{drive}/file/d/{GREETING_FILE_ID}/view",
+        "CONSENT_DATA_PROCESSING_PDF_URL": f"{drive}/file/d/{CONSENT_FILE_IDS[0]}/view",
+        "CONSENT_ADVERTISING_PDF_URL": f"{drive}/file/d/{CONSENT_FILE_IDS[1]}/view",
+        "TELEGRAM_NOTIFY_CHAT_ID": "1",
+        "TELEGRAM_GLOBAL_RATE": str(args.telegram_rate),
+        "STATE_BACKEND": args.state_backend,
+        "DATA_DIR": data_dir,
+        "DRIVE_CACHE_DIR": str(Path(data_dir) / "drive-cache"),
+        "CONTENT_REFRESH_INTERVAL": "0",
+        "BOT_RUN_MODE": "polling",
+        "HTTP_PORT": "",
+        "LOG_LEVEL": "WARNING",
+    })
+
+
+def rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_bench(args: argparse.Namespace, fakes_url: str) -> dict[str, Any]:
+    # Импорт после настройки окружения: Config читает переменные при создании. Заодно процессы пула
+    # картинок, заново импортирующие этот модуль, не загружают бота целиком
+    from bench.chat_simulator import ChatSimulator
+    from bot.bot import Bot
+    from bot.config import Config
+
+    config = Config()
+    config.setup_logging()
+    rss_start = rss_mb()
+    bot = Bot(config)
+    started = time.monotonic()
+    await bot.startup()
+    startup_seconds = time.monotonic() - started
+    rss_ready = rss_mb()
+
+    stats = LatencyStats()
+    probe = LoopLagProbe()
+    probe.start()
+    limit = asyncio.Semaphore(args.concurrency or args.chats)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        simulator = ChatSimulator(bot, session, fakes_url, stats, args.think_time)
+
+        async def one(chat_id: int) -> None:
+            async with limit:
+                await simulator.run(chat_id)
+
+        started = time.monotonic()
+        await asyncio.gather(*(one(10_000 + i) for i in range(args.chats)))
+        elapsed = time.monotonic() - started
+        await probe.stop()
+        rss_end = rss_mb()
+        await bot.shutdown()
+        async with session.get(f"{fakes_url}/bench/stats") as response:
+            fakes = await response.json()
+
+    return {
+        "chats": args.chats,
+        "elapsed": elapsed,
+        "startup_seconds": startup_seconds,
+        "steps_per_second": stats.total / elapsed if elapsed else 0.0,
+        "steps": stats.summary(),
+        "loop_lag": probe.summary(),
+        "rss_mb": {"start": rss_start, "ready": rss_ready, "end": rss_end, "growth": rss_end - rss_ready},
+        "fakes": fakes,
+    }
+
+
+def print_report(result: dict[str, Any]) -> None:
+    print(f"\nПользователей: {result['chats']}, время: {result['elapsed']:.1f} с, "
+          f"запуск бота: {result['startup_seconds']:.2f} с, "
+          f"шагов в секунду: {result['steps_per_second']:.1f}")
+    print(f"\n{'шаг':<10}{'кол-во':>8}{'ошибки':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for step, s in result["steps"].items():
+        print(f"{step:<10}{s['count']:>8}{s['errors']:>8}"
+              f"{s['p50']:>9.3f}{s['p95']:>9.3f}{s['p99']:>9.3f}{s['max']:>9.3f}")
+    lag = result["loop_lag"]
+    print(f"\nЗадержка event loop, мс: p50 {lag['p50'] * 1000:.1f}, "
+          f"p99 {lag['p99'] * 1000:.1f}, max {lag['max'] * 1000:.1f}")
+    rss = result["rss_mb"]
+    print(f"Память (RSS), МБ: до запуска {rss['start']:.0f}, после запуска {rss['ready']:.0f}, "
+          f"в конце {rss['end']:.0f}, прирост {rss['growth']:.0f} "
+          f"({rss['growth'] * 1024 / max(result['chats'], 1):.1f} КБ на пользователя)")
+    print(f"Заглушки: {json.dumps(result['fakes'], ensure_ascii=False)}")
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    regressions = []
+    for step, base in baseline["steps"].items():
+        current = result["steps"].get(step)
+        if current is None:
+            regressions.append(f"{step}: шаг не выполнялся")
+        elif current["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"{step}: p95 {current['p95']:.3f} с против {base['p95']:.3f} с")
+        elif current["errors"] > base["errors"]:
+            regressions.append(f"{step}: ошибок {current['errors']} против {base['errors']}")
+    return regressions
+
+
+def main() -> None:
+    args = parse_args()
+    fakes_url = f"http://127.0.0.1:{args.port}"
+    options = FakeOptions(
+        port=args.port,
+        llm_latency=args.llm_latency,
+        llm_chunk_delay=args.llm_chunk_delay,
+        google_latency=args.google_latency,
+        telegram_latency=args.telegram_latency,
+    )
+    # Заглушки — в отдельном процессе, чтобы не искажать задержку event loop бота
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    fakes = context.Process(target=serve, args=(options, ready), daemon=True)
+    fakes.start()
+    try:
+        if not ready.wait(60):
+            sys.exit("Заглушки не запустились")
+        with tempfile.TemporaryDirectory(prefix="bench-") as data_dir:
+            configure_env(args, fakes_url, data_dir)
+            result = asyncio.run(run_bench(args, fakes_url))
+    finally:
+        fakes.terminate()
+        fakes.join()
+
+    print_report(result)
+    if args.save:
+        args.save.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.tolerance)
+        for line in regressions:
+            print(f"Регрессия: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,245 @@
+import asyncio
 import logging
+import signal
+from urllib.parse import urlparse
 
 from aiogram import Bot as AiogramBot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
+from bot.callback_store import CallbackStore
+from bot.caption_cache import CaptionCache
+from bot.chat_scheduler import ChatScheduler
 from bot.config import Config
+from bot.content_refresher import ContentRefresher
+from bot.fair_limiter import FairLimiter
 from bot.handler import GREETING, Handler
+from bot.history_compressor import HistoryCompressor
+from bot.http_server import HttpServer
+from bot.inflight_tracker import InflightTracker
+from bot.intent_router import IntentRouter
 from bot.llm_client import LLMClient
+from bot.loop_monitor import LoopMonitor
+from bot.memory_state_store import MemoryStateStore
+from bot.metrics import metrics
+from bot.order_queue import OrderQueue
 from bot.order_writer import OrderWriter
-from bot.prompt import Prompt
+from bot.outbound_dispatcher import OutboundDispatcher
+from bot.response_cache import ResponseCache
 from bot.sheets_client import SheetsClient
+from bot.sqlite_state_store import SqliteStateStore
+from bot.state_store import StateStore
+from bot.telegram_file_registry import TelegramFileRegistry
+from bot.update_router import UpdateRouter
+from bot.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
 
 class Bot:
     def __init__(self, config: Config) -> None:
-        self._bot = AiogramBot(token=config.telegram_bot_token)
+        api = PRODUCTION
+        if config.telegram_api_url:
+            api = TelegramAPIServer.from_base(config.telegram_api_url)
+        self._bot = AiogramBot(token=config.telegram_bot_token, session=AiohttpSession(api=api))
         self._bot.session.timeout = 300
+        self._outbound = OutboundDispatcher(config)
+        self._bot.session.middleware(self._outbound)
         self._dp = Dispatcher()
+        self._config = config
+        self._inflight = InflightTracker()
+        self._dp.update.outer_middleware(self._inflight)
+        self._http_server: HttpServer | None = None
+        if config.http_port is not None:
+            self._http_server = HttpServer(config)
+        self._loop_monitor: LoopMonitor | None = None
 
-        sheets_client = SheetsClient(config)
-        sheets_client.load_services()
-        system_prompt = sheets_client.load_prompt()
+        # Маршрутизатор (BOT_WORKERS > 1): апдейты только принимаются и пересылаются процессам-обработчикам
+        self._worker_pool: WorkerPool | None = None
+        self._update_router: UpdateRouter | None = None
+        if config.bot_workers > 1 and config.worker_index is None:
+            self._worker_pool = WorkerPool(config)
+            router = UpdateRouter(config, self._worker_pool.secret)
+            self._update_router = router
+            self._dp.update.outer_middleware(router)
+            metrics.gauge(
+                "router_queue_depth", "Апдейтов, ожидающих пересылки обработчикам", lambda: router.queue_depth,
+            )
+            return
 
+        # Запросы к Google здесь не выполняются: услуги и промт загружаются в start()
+        sheets_client = SheetsClient(config)
         llm_client = LLMClient(config)
-        services_text = sheets_client.format_services_for_prompt()
-        prompt = Prompt(system_prompt, services_text)
         self._sheets_client = sheets_client
 
         order_writer = OrderWriter(config)
-        handler = Handler(config, llm_client, prompt, sheets_client, order_writer)
+        self._order_queue = OrderQueue(config, order_writer)
+        file_registry = TelegramFileRegistry(config)
+        self._file_registry = file_registry
+        callback_store = CallbackStore(config)
+        self._callback_store = callback_store
+        self._state_store: StateStore
+        if config.state_backend == "sqlite":
+            self._state_store = SqliteStateStore(config)
+        else:
+            self._state_store = MemoryStateStore(config)
+        llm_limiter = FairLimiter(config.llm_max_concurrency)
+        history_compressor = HistoryCompressor(config, llm_client, llm_limiter)
+        chat_scheduler = ChatScheduler()
+        response_cache = ResponseCache(config)
+        intent_router = IntentRouter(config, sheets_client)
+        self._caption_cache = CaptionCache(config, llm_client, sheets_client, llm_limiter)
+        handler = Handler(
+            config, llm_client, sheets_client, self._order_queue, file_registry,
+            callback_store, self._state_store, history_compressor, chat_scheduler, llm_limiter,
+            response_cache, intent_router, self._caption_cache,
+        )
+        # Gauge для /metrics считаются в момент запроса
+        for name, help_text, read in (
+            ("chats_active", "Чатов с идущим или ожидающим ходом", lambda: chat_scheduler.active),
+            ("llm_requests_active", "Запросов к LLM в работе", lambda: llm_limiter.active),
+            ("llm_requests_waiting", "Запросов к LLM в очереди", lambda: llm_limiter.waiting),
+            ("callback_store_size", "Записей данных inline-кнопок", lambda: len(callback_store)),
+            ("callback_store_bytes", "Память под данные inline-кнопок, байт (приблизительно)",
+             callback_store.memory_usage),
+            ("drive_cache_hit_ratio", "Доля попаданий в кеш файлов Drive",
+             lambda: sheets_client.cache_hit_ratio),
+            ("response_cache_hit_ratio", "Доля попаданий в кеш ответов LLM",
+             lambda: response_cache.hit_ratio),
+            ("intent_router_hit_ratio", "Доля ответов по шаблону без LLM",
+             lambda: intent_router.hit_ratio),
+            ("caption_cache_hit_ratio", "Доля подписей к примерам из кеша",
+             lambda: self._caption_cache.hit_ratio),
+            ("telegram_queue_depth", "Исходящих запросов, ожидающих лимита Telegram",
+             lambda: self._outbound.queue_depth),
+            ("telegram_retries_total", "Повторов запросов к Telegram после 429 с запуска",
+             lambda: self._outbound.retries_total),
+            ("updates_inflight", "Апдейтов в обработке", lambda: self._inflight.count),
+        ):
+            metrics.gauge(name, help_text, read)
+        self._content_refresher = ContentRefresher(config, sheets_client, handler.set_prompt)
+        self._content_refresher.register(self._dp)
+        if config.diagnostics_enabled:
+            self._loop_monitor = LoopMonitor(config)
+            self._loop_monitor.register(self._dp)
         handler.register(self._dp)
 
     async def start(self) -> None:
-        logger.info("Бот запускается...")
         try:
-            await self._bot.set_my_description(description=GREETING)
-            await self._dp.start_polling(self._bot)
+            await self.startup()
+            if self._config.worker_index is not None:
+                await self._serve_updates("/update", self._config.worker_secret, webhook_url=None)
+            elif self._config.bot_run_mode == "webhook":
+                await self._run_webhook()
+            else:
+                await self._run_polling()
         finally:
+            await self.shutdown()
+
+    async def startup(self) -> None:
+        """Запуск фоновых задач и загрузка услуг/промта — всё, что нужно до приёма апдейтов."""
+        logger.info("Бот запускается...")
+        if self._worker_pool is not None and self._update_router is not None:
+            await self._update_router.start()
+            await asyncio.gather(
+                self._worker_pool.start(), self._bot.set_my_description(description=GREETING),
+            )
+            return
+        if self._loop_monitor is not None:
+            self._loop_monitor.start()
+        self._sheets_client.start()
+        # Независимые запросы к Google и Telegram при запуске — параллельно
+        startup = [self._order_queue.start(), self._content_refresher.start()]
+        if self._config.worker_index is None:
+            # У процессов-обработчиков описание бота задаёт маршрутизатор
+            startup.append(self._bot.set_my_description(description=GREETING))
+        await asyncio.gather(*startup)
+
+    async def shutdown(self) -> None:
+        if self._worker_pool is not None and self._update_router is not None:
+            await self._update_router.stop(self._config.shutdown_timeout)
+            await self._worker_pool.stop()
             await self._bot.session.close()
             logger.info("Бот остановлен")
+            return
+        if self._loop_monitor is not None:
+            await self._loop_monitor.stop()
+        await self._content_refresher.stop()
+        await self._caption_cache.stop()
+        await self._order_queue.stop()
+        await self._state_store.close()
+        await self._callback_store.close()
+        await self._file_registry.close()
+        await self._bot.session.close()
+        self._sheets_client.close()
+        logger.info("Бот остановлен")
+
+    async def feed_update(self, update: Update) -> None:
+        """Обработка одного апдейта без polling и вебхука (нагрузочный тест в bench/)."""
+        await self._dp.feed_update(self._bot, update)
+
+    async def _run_polling(self) -> None:
+        if self._http_server is not None:
+            await self._http_server.start()
+        try:
+            await self._bot.delete_webhook()
+            # Маршрутизатор пересылает апдейты по одному — так сохраняется их порядок
+            await self._dp.start_polling(
+                self._bot,
+                handle_as_tasks=self._update_router is None,
+                allowed_updates=self._allowed_updates(),
+            )
+        finally:
+            if self._http_server is not None:
+                await self._http_server.stop()
+
+    async def _run_webhook(self) -> None:
+        config = self._config
+        assert config.webhook_url is not None
+        await self._serve_updates(
+            urlparse(config.webhook_url).path or "/", config.webhook_secret, webhook_url=config.webhook_url,
+        )
+
+    async def _serve_updates(self, path: str, secret: str | None, webhook_url: str | None) -> None:
+        """Апдейты приходят POST-запросами (от Telegram или маршрутизатора); при SIGTERM/SIGINT —
+        /health отвечает 503, дожидаемся обработки."""
+        assert self._http_server is not None
+        config = self._config
+        app = self._http_server.app
+        SimpleRequestHandler(
+            dispatcher=self._dp, bot=self._bot, secret_token=secret,
+            handle_in_background=self._update_router is None,
+        ).register(app, path=path)
+        setup_application(app, self._dp, bot=self._bot)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+
+        await self._http_server.start()
+        try:
+            if webhook_url is not None:
+                # Вебхук не удаляется при остановке — его продолжают обслуживать другие экземпляры
+                await self._bot.set_webhook(
+                    webhook_url, secret_token=secret, allowed_updates=self._allowed_updates(),
+                )
+                logger.info("Вебхук установлен, ожидание апдейтов")
+            else:
+                logger.info("Обработчик %s ожидает апдейты на %s", config.worker_index, path)
+            await stop.wait()
+            logger.info("Получен сигнал остановки")
+            self._http_server.healthy = False
+            await self._inflight.drain(config.shutdown_timeout)
+        finally:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            await self._http_server.stop()
+
+    def _allowed_updates(self) -> list[str]:
+        if self._update_router is not None:
+            # Обработчики — в других процессах: типы апдейтов, на которые они зарегистрированы
+            return ["message", "callback_query"]
+        return self._dp.resolve_used_update_types()
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import sqlite3
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram на callback_data — 64 байта
+_CALLBACK_DATA_LIMIT = 64
+_INLINE_PREFIX = "="
+# Кортеж (срок, значение), float и узел OrderedDict на одну запись, байт
+_ENTRY_OVERHEAD = 100
+# Как часто удалять из базы устаревшие записи, сек
+_CLEANUP_INTERVAL = 3600
+
+
+class CallbackStore:
+    """Хранилище данных inline-кнопок с ограничением по размеру и времени жизни.
+
+    Короткие значения кодируются прямо в callback_data и не занимают память.
+    Длинные хранятся под случайным ключом; записи лежат в порядке создания,
+    поэтому устаревшие и лишние вытесняются с начала за O(1).
+    При STATE_BACKEND=sqlite записи дублируются в общую базу (в фоне, через отдельный поток):
+    кнопки переживают перезапуск и доступны всем процессам-обработчикам. Память — кеш базы.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._max_size = config.callback_store_max_size
+        self._ttl = config.callback_store_ttl
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._bytes = 0
+        self._executor: ThreadPoolExecutor | None = None
+        self._conn: sqlite3.Connection | None = None
+        self._last_cleanup = 0.0
+        if config.state_backend == "sqlite":
+            path = config.data_dir / "callbacks.sqlite3"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="callback-db")
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS callback_data ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def put(self, value: str) -> str:
+        """Возвращает callback_data для кнопки со значением value."""
+        inline = _INLINE_PREFIX + value
+        if len(inline.encode()) <= _CALLBACK_DATA_LIMIT:
+            return inline
+
+        self._evict_expired()
+        key = uuid.uuid4().hex[:12]
+        self._remember(key, value, self._ttl)
+        if self._executor is not None:
+            self._executor.submit(self._insert, key, value, time.time() + self._ttl)
+        return key
+
+    async def get(self, data: str) -> str | None:
+        """Значение кнопки по callback_data; None — если запись устарела или вытеснена."""
+        if data.startswith(_INLINE_PREFIX):
+            return data[len(_INLINE_PREFIX):]
+        entry = self._items.get(data)
+        if entry is not None:
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                return None
+            return value
+        if self._executor is None:
+            return None
+        row = await asyncio.get_running_loop().run_in_executor(self._executor, self._select, data)
+        if row is None:
+            return None
+        value, expires_at = row
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return None
+        self._remember(data, value, ttl)
+        return value
+
+    async def close(self) -> None:
+        if self._executor is None or self._conn is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._conn.close)
+        self._executor.shutdown(wait=False)
+
+    def memory_usage(self) -> int:
+        """Приблизительный объём памяти под записи, байт."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _remember(self, key: str, value: str, ttl: float) -> None:
+        self._items[key] = (time.monotonic() + ttl, value)
+        self._bytes += self._entry_size(key, value)
+        while len(self._items) > self._max_size:
+            self._evict_oldest()
+
+    def _insert(self, key: str, value: str, expires_at: float) -> None:
+        assert self._conn is not None
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO callback_data (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            now = time.time()
+            if now - self._last_cleanup > _CLEANUP_INTERVAL:
+                self._last_cleanup = now
+                self._conn.execute("DELETE FROM callback_data WHERE expires_at < ?", (now,))
+        except sqlite3.Error:
+            logger.exception("Не удалось сохранить данные кнопки в базу")
+
+    def _select(self, key: str) -> tuple[str, float] | None:
+        assert self._conn is not None
+        return self._conn.execute(
+            "SELECT value, expires_at FROM callback_data WHERE key = ?", (key,),
+        ).fetchone()
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        while self._items:
+            expires_at, _ = next(iter(self._items.values()))
+            if expires_at > now:
+                break
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        key, (_, value) = self._items.popitem(last=False)
+        self._bytes -= self._entry_size(key, value)
+
+    @staticmethod
+    def _entry_size(key: str, value: str) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+
+from bot.config import Config
+from bot.fair_limiter import FairLimiter
+from bot.llm_client import LLMClient
+from bot.prompt import Prompt
+from bot.sheets_client import SheetsClient
+
+logger = logging.getLogger(__name__)
+
+# Ключ очереди LLM для подписей: общий для всех чатов и прогрева
+_LIMITER_KEY = "caption"
+
+
+class CaptionCache:
+    """Подписи LLM к папкам примеров, общие для всех чатов.
+
+    Подпись строится по системному промту и описанию из Google Doc папки, ключ — ID документа
+    и его ревизия: после правки документа подпись генерируется заново. Новый промт (set_prompt)
+    сбрасывает кеш и запускает фоновый прогрев по ссылкам на примеры из таблицы услуг.
+    Одновременные запросы одной подписи ждут одну генерацию. При CAPTION_PERSONALIZED=true
+    подпись строится в Handler по истории чата, кеш не прогревается. При BOT_WORKERS > 1 прогревает
+    только обработчик 0, у остальных подпись генерируется при первом запросе.
+    """
+
+    def __init__(
+        self, config: Config, llm_client: LLMClient, sheets_client: SheetsClient,
+        llm_limiter: FairLimiter,
+    ) -> None:
+        self._model = config.caption_model
+        self._warmup = config.primary_process and not config.caption_personalized
+        self._llm_client = llm_client
+        self._sheets_client = sheets_client
+        self._llm_limiter = llm_limiter
+        self._prompt: Prompt | None = None
+        # ID документа → (ревизия, подпись)
+        self._captions: dict[str, tuple[str, str]] = {}
+        self._pending: dict[str, asyncio.Task[str | None]] = {}
+        self._warm_task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def set_prompt(self, prompt: Prompt) -> None:
+        self._prompt = prompt
+        self._captions.clear()
+        self._pending.clear()
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            self._warm_task = None
+        if self._warmup:
+            self._warm_task = asyncio.create_task(self._warm())
+
+    async def get(self, key: str, description: str) -> str | None:
+        """Подпись для версии документа key (ID:ревизия из SheetsClient.example_description)."""
+        cached = self._lookup(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        return await self._load(key, description)
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._warm_task, *self._pending.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._warm_task = None
+
+    def _lookup(self, key: str) -> str | None:
+        doc_id, _, revision = key.partition(":")
+        cached = self._captions.get(doc_id)
+        return cached[1] if cached is not None and cached[0] == revision else None
+
+    async def _load(self, key: str, description: str) -> str | None:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._generate(key, description))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Отмена одного ожидающего не прерывает генерацию для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task[str | None]) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+    async def _generate(self, key: str, description: str) -> str | None:
+        prompt = self._prompt
+        if prompt is None:
+            return None
+        messages = prompt.build([])
+        messages.append({"role": "user", "content": description.strip()})
+        try:
+            async with self._llm_limiter.slot(_LIMITER_KEY):
+                text = await self._llm_client.complete(messages, model=self._model)
+        except Exception:
+            logger.exception("Ошибка генерации подписи к примеру")
+            return None
+        caption = text.strip() if text else ""
+        if not caption:
+            return None
+        # Пока шла генерация, промт могли сменить — такая подпись уже устарела
+        if self._prompt is prompt:
+            doc_id, _, revision = key.partition(":")
+            self._captions[doc_id] = (revision, caption)
+        return caption
+
+    async def _warm(self) -> None:
+        urls = dict.fromkeys(
+            url for s in self._sheets_client.services
+            if "/folders/" in (url := str(s.get("Пример (ссылка)", "")).strip())
+        )
+        # По одной папке: прогрев не должен занимать очередь LLM, пока идут диалоги
+        warmed = 0
+        for url in urls:
+            try:
+                key, description = await self._sheets_client.example_description(url)
+                if key and (self._lookup(key) or await self._load(key, description)):
+                    warmed += 1
+            except Exception:
+                logger.warning("Не удалось подготовить подпись к примерам %s", url, exc_info=True)
+        if urls:
+            logger.info("Подписи к примерам подготовлены: %d из %d", warmed, len(urls))
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class ChatScheduler:
+    """Последовательная обработка событий одного чата.
+
+    Сообщения, пришедшие, пока чат занят, объединяются в один ход LLM.
+    Повтор того же текста, пришедший во время его обработки (двойное нажатие кнопки), отбрасывается.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._users: dict[int, int] = {}
+        self._pending: dict[int, list[tuple[str, Any, float]]] = {}
+        self._last_done: dict[int, tuple[str, float]] = {}
+
+    @property
+    def active(self) -> int:
+        """Чатов, у которых сейчас идёт или ожидает ход."""
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, chat_id: int) -> AsyncIterator[None]:
+        """Исключительный доступ к состоянию чата."""
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._users[chat_id] = self._users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[chat_id] -= 1
+            if not self._users[chat_id]:
+                del self._users[chat_id]
+                del self._locks[chat_id]
+                self._last_done.pop(chat_id, None)
+
+    async def submit(
+        self, chat_id: int, text: str, target: Any,
+        turn: Callable[[int, str, Any], Awaitable[None]],
+    ) -> None:
+        """Ставит текст в очередь чата; ход выполняет первый из ожидающих, забирая всё накопившееся."""
+        pending = self._pending.setdefault(chat_id, [])
+        pending.append((text, target, time.monotonic()))
+        if len(pending) > 1:
+            return
+
+        async with self.lock(chat_id):
+            batch = self._pending.pop(chat_id, [])
+            last_text, done_at = self._last_done.get(chat_id, ("", 0.0))
+            texts = [t for t, _, at in batch if not (t == last_text and at <= done_at)]
+            if not texts:
+                logger.info("chat_id=%s — повтор во время обработки пропущен", chat_id)
+                return
+            merged = "\n".join(dict.fromkeys(texts))
+            if len(batch) > 1:
+                logger.info("chat_id=%s — объединено сообщений в один ход: %d", chat_id, len(batch))
+            try:
+                await turn(chat_id, merged, batch[-1][1])
+            finally:
+                self._last_done[chat_id] = (merged, time.monotonic())
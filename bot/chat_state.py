@@ -0,0 +1,45 @@
+import json
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ChatState:
+    """Состояние диалога одного чата: история для LLM, сводка старых сообщений и флаги согласия."""
+
+    history: list[dict[str, str]] = field(default_factory=list)
+    consent_given: bool = False
+    pending_consent_text: str = ""
+    # Сводка старой части диалога, не поместившейся в бюджет токенов
+    summary: str = ""
+    # Последний ответ — шаблон IntentRouter: следующее сообщение тоже можно отдать роутеру
+    template_answer: bool = False
+
+    def to_json(self, max_bytes: int) -> str:
+        """Компактная запись; если она больше max_bytes, отбрасываются самые старые сообщения истории."""
+        history = list(self.history)
+        while True:
+            record: dict = {"h": [[m["role"][0], m["content"]] for m in history]}
+            if self.consent_given:
+                record["c"] = 1
+            if self.pending_consent_text:
+                record["p"] = self.pending_consent_text
+            if self.summary:
+                record["m"] = self.summary
+            if self.template_answer:
+                record["t"] = 1
+            data = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+            if len(data.encode()) <= max_bytes or not history:
+                return data
+            history = history[1:]
+
+    @classmethod
+    def from_json(cls, data: str) -> "ChatState":
+        record = json.loads(data)
+        roles = {"u": "user", "a": "assistant", "s": "system"}
+        return cls(
+            history=[{"role": roles[r], "content": c} for r, c in record.get("h", [])],
+            consent_given=bool(record.get("c")),
+            pending_consent_text=record.get("p", ""),
+            summary=record.get("m", ""),
+            template_answer=bool(record.get("t")),
+        )
@@ -1,14 +1,17 @@
+import json
 import logging
 import os
 import tempfile
 from pathlib import Path
+from typing import Any
 
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
 
-_ENV_PATH = Path(__file__).resolve().parent.parent / ".env"
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+_ENV_PATH = _PROJECT_ROOT / ".env"
 
 
 class Config:
@@ -16,19 +19,151 @@ class Config:
         load_dotenv(_ENV_PATH)
 
         self.telegram_bot_token: str = self._require("TELEGRAM_BOT_TOKEN")
+        # Свой сервер Bot API вместо api.telegram.org (локальный telegram-bot-api, стенд)
+        self.telegram_api_url: str | None = os.getenv("TELEGRAM_API_URL") or None
+        # Получение апдейтов: polling (long polling) или webhook (локальный HTTP-сервер за балансировщиком)
+        self.bot_run_mode: str = os.getenv("BOT_RUN_MODE", "polling").strip().lower()
+        if self.bot_run_mode not in ("polling", "webhook"):
+            raise RuntimeError("BOT_RUN_MODE должен быть polling или webhook")
+        # Публичный адрес вебхука (https://host/path) и секрет для заголовка X-Telegram-Bot-Api-Secret-Token
+        self.webhook_url: str | None = None
+        self.webhook_secret: str | None = None
+        if self.bot_run_mode == "webhook":
+            self.webhook_url = self._require("WEBHOOK_URL")
+            self.webhook_secret = self._require("WEBHOOK_SECRET")
+        # HTTP-сервер (вебхук, /health): в режиме polling запускается, только если задан HTTP_PORT
+        self.http_host: str = os.getenv("HTTP_HOST", "0.0.0.0")
+        self.http_port: int | None = self._optional_int("HTTP_PORT")
+        if self.http_port is None and self.bot_run_mode == "webhook":
+            self.http_port = 8080
+        # Несколько процессов-обработчиков на один токен (BOT_WORKERS > 1): этот процесс только получает апдейты
+        # и пересылает их обработчикам по chat_id; обработчики слушают 127.0.0.1 на WORKER_BASE_PORT + номер
+        self.bot_workers: int = int(os.getenv("BOT_WORKERS", "1"))
+        self.worker_base_port: int = int(os.getenv("WORKER_BASE_PORT", "8100"))
+        # Номер процесса-обработчика и секрет для пересылки — задаёт маршрутизатор при запуске обработчиков
+        self.worker_index: int | None = self._optional_int("BOT_WORKER_INDEX")
+        self.worker_secret: str | None = os.getenv("BOT_WORKER_SECRET") or None
+        if self.worker_index is not None:
+            self.http_host = "127.0.0.1"
+            self.http_port = self.worker_base_port + self.worker_index
+        # Единственный процесс или обработчик 0: опрашивает Google, пишет общий снимок услуг, прогревает подписи
+        self.primary_process: bool = self.worker_index in (None, 0)
+        # Сколько ждать завершения обрабатываемых апдейтов при остановке (сек)
+        self.shutdown_timeout: float = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
         # Ключ OpenAI (при использовании OpenAI напрямую) или OpenRouter
         self.openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
         self.openrouter_api_key: str | None = os.getenv("OPENROUTER_API_KEY")
         if not self.openai_api_key and not self.openrouter_api_key:
             raise RuntimeError("Задайте OPENAI_API_KEY или OPENROUTER_API_KEY в .env")
         self.llm_model: str = self._require("LLM_MODEL")
+        # Другой OpenAI-совместимый адрес LLM (прокси, стенд); по умолчанию — OpenAI или OpenRouter
+        self.llm_base_url: str | None = os.getenv("LLM_BASE_URL") or None
+        # Потоковый ответ LLM: сообщение появляется сразу и дописывается правками не чаще интервала (сек)
+        self.llm_streaming: bool = self._bool("LLM_STREAMING", True)
+        self.stream_edit_interval: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+        # Максимум одновременных запросов к LLM на процесс (очередь честная между чатами)
+        self.llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        # Таймаут одной попытки запроса к LLM (сек), число повторов при 429/5xx/таймауте и базовая задержка (сек)
+        self.llm_timeout: float = float(os.getenv("LLM_TIMEOUT", "60"))
+        self.llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.llm_retry_base_delay: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        # Резервные модели через запятую — по порядку, если основная недоступна
+        self.llm_fallback_models: list[str] = self._str_list("LLM_FALLBACK_MODELS")
+        # Дублирующий запрос, если ответа нет дольше этого перцентиля задержек (например 0.95); 0 — выключено
+        self.llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+        # Кеш ответов LLM для одинаковых запросов (/start, кнопки в начале диалога): время жизни (сек), 0 — выключен
+        self.response_cache_ttl: int = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.response_cache_max_size: int = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "256"))
+        # Ответы без LLM на частые вопросы (перечень услуг, карточка услуги, цена, сроки) — по шаблону из таблицы услуг.
+        # Текст не длиннее INTENT_MAX_WORDS слов; ключевые слова — целые слова и словоформы через запятую,
+        # INTENT_SKIP_KEYWORDS — начала слов: с ними (почему, скидка, дорого) сообщение всегда уходит в LLM
+        self.intent_router: bool = self._bool("INTENT_ROUTER", True)
+        self.intent_max_words: int = int(os.getenv("INTENT_MAX_WORDS", "6"))
+        self.intent_price_list_keywords: list[str] = self._str_list(
+            "INTENT_PRICE_LIST_KEYWORDS",
+            "услуги и цены,прайс,прайс-лист,список услуг,перечень услуг,какие услуги,все услуги",
+        )
+        self.intent_price_keywords: list[str] = self._str_list(
+            "INTENT_PRICE_KEYWORDS",
+            "цена,цены,цену,стоимость,стоимости,сколько стоит,сколько стоят,почём",
+        )
+        self.intent_deadline_keywords: list[str] = self._str_list(
+            "INTENT_DEADLINE_KEYWORDS",
+            "срок,сроки,сроков,как долго,сколько времени,когда будет готов,когда будет готово",
+        )
+        self.intent_details_keywords: list[str] = self._str_list(
+            "INTENT_DETAILS_KEYWORDS", "подробнее,подробно,подробности,расскажи,расскажите,что входит,описание",
+        )
+        self.intent_skip_keywords: list[str] = self._str_list(
+            "INTENT_SKIP_KEYWORDS", "почему,зачем,можно ли,скидк,дорог,дешев,не устраива",
+        )
+        # Разметка cache_control для системного промта (OpenRouter: модели Anthropic/Gemini).
+        # OpenAI кеширует одинаковый префикс сам — разметка не нужна
+        self.llm_prompt_cache_control: bool = self._bool("LLM_PROMPT_CACHE_CONTROL", False)
         self.max_history_messages: int = int(os.getenv("MAX_HISTORY_MESSAGES", "20"))
+        # Бюджет токенов истории: не поместившиеся старые сообщения сжимаются в сводку
+        self.history_token_budget: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+        # Модель для сводки истории (можно дешевле основной); по умолчанию — LLM_MODEL
+        self.summary_model: str = os.getenv("SUMMARY_MODEL") or self.llm_model
+        # Подписи к примерам: модель (можно дешевле основной; по умолчанию — LLM_MODEL) и учёт истории чата.
+        # Без учёта истории подпись общая для всех чатов, готовится заранее и берётся из кеша
+        self.caption_model: str = os.getenv("CAPTION_MODEL") or self.llm_model
+        self.caption_personalized: bool = self._bool("CAPTION_PERSONALIZED", False)
+        # Состояние диалогов: memory (в памяти процесса) или sqlite (файл в DATA_DIR, переживает перезапуск)
+        self.state_backend: str = os.getenv("STATE_BACKEND", "sqlite").strip().lower()
+        if self.state_backend not in ("memory", "sqlite"):
+            raise RuntimeError("STATE_BACKEND должен быть memory или sqlite")
+        if self.bot_workers > 1 and self.state_backend != "sqlite":
+            raise RuntimeError("При BOT_WORKERS > 1 нужен STATE_BACKEND=sqlite — общее состояние процессов")
+        # Лимиты: число чатов в памяти, время неактивности до удаления (сек), размер записи одного чата (байт)
+        self.state_max_chats: int = int(os.getenv("STATE_MAX_CHATS", "10000"))
+        self.state_ttl: int = int(os.getenv("STATE_TTL", "604800"))
+        self.state_max_chat_bytes: int = int(os.getenv("STATE_MAX_CHAT_BYTES", "32768"))
+        # Данные inline-кнопок: максимум записей и время жизни (сек)
+        self.callback_store_max_size: int = int(os.getenv("CALLBACK_STORE_MAX_SIZE", "10000"))
+        self.callback_store_ttl: int = int(os.getenv("CALLBACK_STORE_TTL", "172800"))
         self.google_sheets_services_url: str = self._require("GOOGLE_SHEETS_SERVICES_URL")
         self.google_doc_prompt_url: str = self._require("GOOGLE_DOC_PROMPT_URL")
         self.google_sheets_orders_url: str = self._require("GOOGLE_SHEETS_ORDERS_URL")
+        # Очередь заявок: окно сбора пакета (сек), размер пакета, задержки повторов при ошибках (сек)
+        self.order_batch_window: float = float(os.getenv("ORDER_BATCH_WINDOW", "0.5"))
+        self.order_batch_size: int = int(os.getenv("ORDER_BATCH_SIZE", "50"))
+        self.order_retry_base_delay: float = float(os.getenv("ORDER_RETRY_BASE_DELAY", "1"))
+        self.order_retry_max_delay: float = float(os.getenv("ORDER_RETRY_MAX_DELAY", "60"))
         self.best_example_url: str = self._require("BEST_EXAMPLE_URL")
-        self.service_account_path: Path = self._resolve_service_account_path()
+        self.service_account_info: dict[str, Any] = self._load_service_account_info()
         self.log_level: str = os.getenv("LOG_LEVEL", "INFO")
+        # Каталог для локальных данных бота (реестр file_id и т.п.)
+        self.data_dir: Path = Path(os.getenv("DATA_DIR") or _PROJECT_ROOT / "data")
+        # Файлы одного процесса (журнал заявок, реестр file_id); общие — состояние, кнопки и снимок услуг в data_dir
+        self.process_data_dir: Path = self.data_dir
+        if self.worker_index is not None:
+            self.process_data_dir = self.data_dir / f"worker-{self.worker_index}"
+        # Перенаправление запросов к Google API на другой адрес (стенд, заглушки нагрузочного теста)
+        self.google_api_base_url: str | None = os.getenv("GOOGLE_API_BASE_URL") or None
+        # Потоки для синхронных запросов к Google (Drive/Docs), чтобы не блокировать event loop
+        self.google_io_workers: int = int(os.getenv("GOOGLE_IO_WORKERS", "8"))
+        # Одновременных загрузок файлов с Drive на процесс и таймаут одного запроса к Google (сек)
+        self.google_download_concurrency: int = int(os.getenv("GOOGLE_DOWNLOAD_CONCURRENCY", "6"))
+        self.google_request_timeout: float = float(os.getenv("GOOGLE_REQUEST_TIMEOUT", "20"))
+
+        # Кеш файлов Google Drive (картинки, PDF, описания): память + диск, список папок с TTL
+        self.drive_cache_dir: Path = Path(
+            os.getenv("DRIVE_CACHE_DIR") or Path(tempfile.gettempdir()) / "matveeva-ai-drive-cache"
+        )
+        self.drive_cache_memory_mb: int = int(os.getenv("DRIVE_CACHE_MEMORY_MB", "64"))
+        self.drive_cache_disk_mb: int = int(os.getenv("DRIVE_CACHE_DISK_MB", "512"))
+        self.drive_listing_ttl: int = int(os.getenv("DRIVE_LISTING_TTL", "300"))
+
+        # Обработка картинок-примеров перед отправкой: уменьшение до IMAGE_MAX_SIDE пикселей, формат jpeg/webp,
+        # качество 1–95, число процессов
+        self.image_processing: bool = self._bool("IMAGE_PROCESSING", True)
+        self.image_max_side: int = int(os.getenv("IMAGE_MAX_SIDE", "1280"))
+        self.image_format: str = os.getenv("IMAGE_FORMAT", "jpeg").strip().lower()
+        if self.image_format not in ("jpeg", "webp"):
+            raise RuntimeError("IMAGE_FORMAT должен быть jpeg или webp")
+        self.image_quality: int = int(os.getenv("IMAGE_QUALITY", "85"))
+        self.image_workers: int = int(os.getenv("IMAGE_WORKERS", "2"))
 
         # Картинка к приветствию при /start (опционально): ссылка на Google Drive
         self.greeting_image_url: str | None = os.getenv("GREETING_IMAGE_URL") or None
@@ -39,19 +174,35 @@ class Config:
 
         # Уведомление о заявке в Telegram (опционально)
         self.telegram_notify_chat_id: int | None = self._optional_int("TELEGRAM_NOTIFY_CHAT_ID")
+        # Лимиты исходящих сообщений Telegram: общий (сообщ./сек), на чат (сообщ./сек и запас подряд),
+        # число повторов после 429
+        self.telegram_global_rate: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+        if self.worker_index is not None:
+            # Общий лимит токена делится между процессами-обработчиками
+            self.telegram_global_rate /= self.bot_workers
+        self.telegram_chat_rate: float = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+        self.telegram_chat_burst: float = float(os.getenv("TELEGRAM_CHAT_BURST", "5"))
+        self.telegram_max_retries: int = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+        # Администраторы бота (chat_id через запятую): служебные команды, например /reload
+        self.admin_chat_ids: list[int] = self._int_list("ADMIN_CHAT_IDS")
+        # Как часто проверять изменения таблицы услуг и документа с промтом (сек); 0 — не проверять
+        self.content_refresh_interval: int = int(os.getenv("CONTENT_REFRESH_INTERVAL", "300"))
 
-    def _resolve_service_account_path(self) -> Path:
-        """Путь к ключу: из файла (GOOGLE_APPLICATION_CREDENTIALS) или из JSON в переменной (для Railway)."""
+        # Диагностика event loop (по умолчанию выключена): период замера задержки (сек) и порог,
+        # после которого шаг обработчика считается блокирующим и снимается стек (сек)
+        self.diagnostics_enabled: bool = self._bool("DIAGNOSTICS_ENABLED", False)
+        self.diagnostics_lag_interval: float = float(os.getenv("DIAGNOSTICS_LAG_INTERVAL", "0.5"))
+        self.diagnostics_block_threshold: float = float(os.getenv("DIAGNOSTICS_BLOCK_THRESHOLD", "0.1"))
+
+    def _load_service_account_info(self) -> dict[str, Any]:
+        """Ключ сервисного аккаунта: JSON из переменной (для Railway) или из файла (GOOGLE_APPLICATION_CREDENTIALS)."""
         json_content = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
         if json_content:
-            tmp = tempfile.NamedTemporaryFile(
-                mode="w", suffix=".json", delete=False, encoding="utf-8"
-            )
-            tmp.write(json_content)
-            tmp.close()
             logger.info("Ключ Google взят из переменной GOOGLE_SERVICE_ACCOUNT_JSON")
-            return Path(tmp.name)
-        return Path(self._require("GOOGLE_APPLICATION_CREDENTIALS"))
+            return json.loads(json_content)
+        path = Path(self._require("GOOGLE_APPLICATION_CREDENTIALS"))
+        return json.loads(path.read_text(encoding="utf-8"))
 
     @staticmethod
     def _require(name: str) -> str:
@@ -70,6 +221,27 @@ class Config:
         except ValueError:
             return None
 
+    @staticmethod
+    def _int_list(name: str) -> list[int]:
+        values: list[int] = []
+        for part in (os.getenv(name) or "").split(","):
+            try:
+                values.append(int(part.strip()))
+            except ValueError:
+                continue
+        return values
+
+    @staticmethod
+    def _str_list(name: str, default: str = "") -> list[str]:
+        return [part.strip() for part in (os.getenv(name) or default).split(",") if part.strip()]
+
+    @staticmethod
+    def _bool(name: str, default: bool) -> bool:
+        value = os.getenv(name)
+        if not value:
+            return default
+        return value.strip().lower() in ("1", "true", "yes", "on")
+
     def setup_logging(self) -> None:
         logging.basicConfig(
             level=self.log_level,
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from collections.abc import Callable
+
+from aiogram import Dispatcher, F, types
+from aiogram.filters import Command
+
+from bot.config import Config
+from bot.content_snapshot import ContentSnapshot
+from bot.prompt import Prompt
+from bot.sheets_client import SheetsClient
+
+logger = logging.getLogger(__name__)
+
+
+class ContentRefresher:
+    """Фоновое обновление перечня услуг и системного промта без перезапуска бота.
+
+    Периодически сверяет modifiedTime таблицы услуг и документа с промтом и перезагружает
+    их только при изменении. Новый Prompt передаётся в on_reload целиком — запросы
+    в обработке продолжают работать со старым объектом, блокировки не нужны.
+    Загруженное сохраняется в снимок: при следующем запуске бот стартует с него,
+    не дожидаясь Google. При BOT_WORKERS > 1 Google опрашивает и снимок пишет только обработчик 0,
+    остальные перечитывают снимок, когда он меняется; /reload маршрутизатор шлёт всем обработчикам.
+    """
+
+    def __init__(
+        self, config: Config, sheets_client: SheetsClient,
+        on_reload: Callable[[Prompt], None],
+    ) -> None:
+        self._sheets_client = sheets_client
+        self._on_reload = on_reload
+        self._interval = config.content_refresh_interval
+        self._admin_chat_ids = config.admin_chat_ids
+        self._cache_control = config.llm_prompt_cache_control
+        self._primary = config.primary_process
+        self._reply_prefix = f"Обработчик {config.worker_index}: " if config.worker_index is not None else ""
+        self._snapshot = ContentSnapshot(config)
+        self._snapshot_modified: float | None = None
+        self._versions: tuple[str, str] | None = None
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    def register(self, dp: Dispatcher) -> None:
+        dp.message.register(
+            self._on_reload_command, Command("reload"), F.chat.id.in_(self._admin_chat_ids),
+        )
+
+    async def start(self) -> None:
+        """Услуги и промт из снимка (свежие — в фоне) или, если снимка нет, из Google с ожиданием."""
+        self._snapshot_modified, snapshot = await asyncio.to_thread(self._read_snapshot, None)
+        if snapshot is None:
+            await self.refresh(force=True)
+        else:
+            services, system_prompt, self._versions = snapshot
+            self._apply(services, system_prompt)
+        if snapshot is None and self._interval <= 0:
+            logger.info("Фоновое обновление услуг и промта отключено")
+            return
+        self._task = asyncio.create_task(self._run(check_now=snapshot is not None))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Перезагружает услуги и промт, если они изменились (или принудительно). True — если обновлено."""
+        async with self._lock:
+            if force:
+                versions, (services, system_prompt) = await asyncio.gather(
+                    self._sheets_client.content_versions(), self._sheets_client.fetch_content(),
+                )
+                self._sheets_client.clear_metadata_cache()
+            else:
+                versions = await self._sheets_client.content_versions()
+                if versions == self._versions:
+                    return False
+                services, system_prompt = await self._sheets_client.fetch_content()
+            self._apply(services, system_prompt)
+            self._versions = versions
+            if self._primary:
+                await asyncio.to_thread(self._snapshot.save, services, system_prompt, versions)
+            logger.info("Услуги и системный промт обновлены")
+            return True
+
+    async def _follow_snapshot(self) -> None:
+        """Услуги и промт из снимка основного процесса, если он изменился."""
+        async with self._lock:
+            self._snapshot_modified, snapshot = await asyncio.to_thread(
+                self._read_snapshot, self._snapshot_modified,
+            )
+            if snapshot is None or snapshot[2] == self._versions:
+                return
+            services, system_prompt, self._versions = snapshot
+            self._apply(services, system_prompt)
+            logger.info("Услуги и системный промт обновлены по снимку")
+
+    def _read_snapshot(
+        self, known: float | None,
+    ) -> tuple[float | None, tuple[list[dict[str, str]], str, tuple[str, str]] | None]:
+        """Время изменения снимка и сам снимок — если он есть и изменился после known."""
+        modified = self._snapshot.modified()
+        if modified is None or modified == known:
+            return modified, None
+        return modified, self._snapshot.load()
+
+    def _apply(self, services: list[dict[str, str]], system_prompt: str) -> None:
+        self._sheets_client.services = services
+        prompt = Prompt(
+            system_prompt, self._sheets_client.format_services_for_prompt(), self._cache_control,
+        )
+        self._on_reload(prompt)
+
+    async def _run(self, check_now: bool) -> None:
+        if check_now:
+            await self._refresh_logged()
+        if self._interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self._interval)
+            await self._refresh_logged()
+
+    async def _refresh_logged(self) -> None:
+        try:
+            if self._primary:
+                await self.refresh()
+            else:
+                await self._follow_snapshot()
+        except Exception:
+            logger.exception("Ошибка фонового обновления услуг и промта")
+
+    async def _on_reload_command(self, message: types.Message) -> None:
+        logger.info("chat_id=%s — принудительное обновление услуг и промта", message.chat.id)
+        try:
+            await self.refresh(force=True)
+        except Exception:
+            logger.exception("Ошибка принудительного обновления услуг и промта")
+            await message.answer(f"{self._reply_prefix}Не удалось обновить услуги и промт, подробности в логах.")
+            return
+        await message.answer(f"{self._reply_prefix}Обновлено. Услуг: {len(self._sheets_client.services)}.")
@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ContentSnapshot:
+    """Последние загруженные услуги и системный промт в JSON-файле.
+
+    При запуске бот сразу работает со снимком, а свежие данные подгружает в фоне. Снимок общий
+    для процессов-обработчиков: пишет его основной процесс, остальные перечитывают при изменении.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._path: Path = config.data_dir / "content_snapshot.json"
+
+    def load(self) -> tuple[list[dict[str, str]], str, tuple[str, str]] | None:
+        """Услуги, промт и версии (modifiedTime) из снимка; None — если снимка нет."""
+        try:
+            with self._path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            services = [dict(s) for s in data["services"]]
+            prompt = str(data["prompt"])
+            versions = (str(data["versions"][0]), str(data["versions"][1]))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            logger.exception("Не удалось прочитать снимок услуг и промта: %s", self._path)
+            return None
+        logger.info("Снимок загружен: услуг %d, промт %d символов", len(services), len(prompt))
+        return services, prompt, versions
+
+    def modified(self) -> float | None:
+        """Время изменения файла снимка; None — если снимка нет."""
+        try:
+            return self._path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def save(
+        self, services: list[dict[str, str]], prompt: str, versions: tuple[str, str],
+    ) -> None:
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(
+                    {"services": services, "prompt": prompt, "versions": list(versions)},
+                    f, ensure_ascii=False, separators=(",", ":"),
+                )
+            os.replace(tmp, self._path)
+        except OSError:
+            logger.exception("Не удалось сохранить снимок услуг и промта: %s", self._path)
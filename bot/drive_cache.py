@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class DriveCache:
+    """Кеш файлов Google Drive: LRU в памяти (по байтам) + каталог на диске + метаданные с TTL.
+
+    Ключ файла — ID на Drive и его версия, поэтому изменённый файл получает новый ключ
+    и старая копия просто вытесняется. Дисковые методы блокирующие — их вызывают в пуле потоков.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._memory_limit = config.drive_cache_memory_mb * 1024 * 1024
+        self._disk_dir = config.drive_cache_dir
+        self._disk_limit = config.drive_cache_disk_mb * 1024 * 1024
+        self._meta_ttl = config.drive_listing_ttl
+        self._meta: dict[str, tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def key(meta: dict[str, str]) -> str:
+        version = meta.get("md5Checksum") or meta.get("modifiedTime") or ""
+        return f"{meta['id']}:{version}"
+
+    def get(self, key: str) -> bytes | None:
+        data = self._memory.get(key)
+        if data is None:
+            return None
+        self._memory.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self._memory_limit:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self._memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def read_disk(self, key: str) -> bytes | None:
+        path = self._disk_path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def write_disk(self, key: str, data: bytes) -> None:
+        path = self._disk_path(key)
+        # Имя временного файла — с PID: каталог кеша общий у процессов-обработчиков
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except OSError:
+            logger.exception("Не удалось записать файл в дисковый кеш: %s", path)
+
+    def get_meta(self, key: str) -> Any | None:
+        entry = self._meta.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() > expires_at:
+            del self._meta[key]
+            return None
+        return value
+
+    def put_meta(self, key: str, value: Any) -> None:
+        self._meta[key] = (time.monotonic() + self._meta_ttl, value)
+
+    def clear_meta(self) -> None:
+        self._meta.clear()
+
+    def _disk_path(self, key: str) -> Path:
+        return self._disk_dir / hashlib.sha256(key.encode()).hexdigest()
+
+    def _prune_disk(self) -> None:
+        files = [p for p in self._disk_dir.iterdir() if p.is_file()]
+        total = sum(p.stat().st_size for p in files)
+        if total <= self._disk_limit:
+            return
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= self._disk_limit:
+                break
+        logger.info("Дисковый кеш Drive очищен до %d байт", total)
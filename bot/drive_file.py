@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class DriveFile:
+    """Файл с Google Drive: ID, версия (md5Checksum или modifiedTime) и содержимое."""
+
+    id: str
+    version: str
+    data: bytes
+    name: str = ""
+    mime_type: str = ""
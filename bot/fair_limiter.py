@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class FairLimiter:
+    """Глобальное ограничение одновременных запросов с честной очередью.
+
+    Свободный слот достаётся ожидающим по кругу между ключами (чатами),
+    поэтому активный чат не занимает все слоты в ущерб остальным. Ключ не обязательно chat_id:
+    фоновые запросы занимают общую очередь под своим ключом (подписи к примерам — "caption")
+    и получают слот наравне с одним чатом.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit = limit
+        self._active = 0
+        self._queues: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable) -> AsyncIterator[None]:
+        if self._active < self._limit and not self._queues:
+            self._active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._queues.setdefault(key, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже был передан — возвращаем его следующему
+                    self._release()
+                else:
+                    self._discard(key, future)
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            if not future.done():
+                # Слот переходит ожидающему, число активных не меняется
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def _discard(self, key: Hashable, future: asyncio.Future) -> None:
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[key]
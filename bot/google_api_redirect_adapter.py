@@ -0,0 +1,23 @@
+from typing import Any
+from urllib.parse import urlsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+
+
+class GoogleApiRedirectAdapter(HTTPAdapter):
+    """Транспорт requests, отправляющий запросы к Google на другой адрес.
+
+    https://<host>/<path> превращается в <base_url>/<host>/<path> — так бот работает
+    со стендом или локальными заглушками Google API (нагрузочный тест в bench/).
+    """
+
+    def __init__(self, base_url: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._base_url = base_url.rstrip("/")
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        parts = urlsplit(request.url or "")
+        query = f"?{parts.query}" if parts.query else ""
+        request.url = f"{self._base_url}/{parts.netloc}{parts.path}{query}"
+        return super().send(request, **kwargs)
@@ -1,8 +1,13 @@
+import asyncio
+import functools
 import logging
 import re
-import uuid
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
 
 from aiogram import Dispatcher, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart
 from aiogram.types import (
     BufferedInputFile,
@@ -11,11 +16,25 @@ from aiogram.types import (
     InputMediaPhoto,
 )
 
+from bot.callback_store import CallbackStore
+from bot.caption_cache import CaptionCache
+from bot.chat_scheduler import ChatScheduler
+from bot.chat_state import ChatState
 from bot.config import Config
+from bot.drive_file import DriveFile
+from bot.fair_limiter import FairLimiter
+from bot.history_compressor import HistoryCompressor
+from bot.intent_router import IntentRouter
 from bot.llm_client import LLMClient
+from bot.metrics import metrics
+from bot.order_queue import OrderQueue
 from bot.order_writer import OrderWriter
 from bot.prompt import Prompt
+from bot.response_cache import ResponseCache
 from bot.sheets_client import SheetsClient
+from bot.state_store import StateStore
+from bot.stream_text_buffer import StreamTextBuffer
+from bot.telegram_file_registry import TelegramFileRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -42,64 +61,101 @@ _ORDER_INTENT_KEYWORDS = (
 
 class Handler:
     def __init__(
-        self, config: Config, llm_client: LLMClient,
-        prompt: Prompt, sheets_client: SheetsClient,
-        order_writer: OrderWriter,
+        self, config: Config, llm_client: LLMClient, sheets_client: SheetsClient,
+        order_queue: OrderQueue, file_registry: TelegramFileRegistry,
+        callback_store: CallbackStore, state_store: StateStore,
+        history_compressor: HistoryCompressor, chat_scheduler: ChatScheduler,
+        llm_limiter: FairLimiter, response_cache: ResponseCache, intent_router: IntentRouter,
+        caption_cache: CaptionCache,
     ) -> None:
         self._llm_client = llm_client
-        self._prompt = prompt
+        # Настоящий промт приходит через set_prompt до начала приёма апдейтов
+        self._prompt = Prompt("")
         self._sheets_client = sheets_client
-        self._order_writer = order_writer
+        self._order_queue = order_queue
+        self._file_registry = file_registry
+        self._callback_store = callback_store
         self._notify_chat_id = config.telegram_notify_chat_id
         self._best_example_url = config.best_example_url
         self._greeting_image_url = config.greeting_image_url
         self._consent_data_pdf_url = config.consent_data_processing_pdf_url
         self._consent_advertising_pdf_url = config.consent_advertising_pdf_url
-        self._max_history = config.max_history_messages
-        self._histories: dict[int, list[dict[str, str]]] = {}
-        self._button_map: dict[str, str] = {}
-        self._consent_given: dict[int, bool] = {}
-        self._pending_consent_text: dict[int, str] = {}
+        self._history_compressor = history_compressor
+        self._llm_streaming = config.llm_streaming
+        self._stream_edit_interval = config.stream_edit_interval
+        self._state_store = state_store
+        self._chat_scheduler = chat_scheduler
+        self._llm_limiter = llm_limiter
+        self._response_cache = response_cache
+        self._intent_router = intent_router
+        self._caption_cache = caption_cache
+        self._caption_personalized = config.caption_personalized
+        self._caption_model = config.caption_model
+        self._llm_model = config.llm_model
+
+    def set_prompt(self, prompt: Prompt) -> None:
+        """Подменяет промт (после обновления услуг или документа); текущие запросы дорабатывают со старым."""
+        self._prompt = prompt
+        self._response_cache.clear()
+        self._caption_cache.set_prompt(prompt)
 
     def register(self, dp: Dispatcher) -> None:
-        dp.message.register(self._on_start, CommandStart())
-        dp.message.register(self._on_message)
-        dp.callback_query.register(self._on_callback)
+        dp.message.register(self._timed("start", self._on_start), CommandStart())
+        dp.message.register(self._timed("message", self._on_message))
+        dp.callback_query.register(self._timed("callback", self._on_callback))
+
+    @staticmethod
+    def _timed(
+        entry: str, handler: Callable[[Any], Awaitable[None]],
+    ) -> Callable[[Any], Awaitable[None]]:
+        """Обёртка обработчика: полное время обработки апдейта — в метрику handler_seconds."""
+        @functools.wraps(handler)
+        async def timed(event: Any) -> None:
+            with metrics.timer("handler_seconds", entry=entry):
+                await handler(event)
+        return timed
 
     async def _on_start(self, message: types.Message) -> None:
         chat_id = message.chat.id
         logger.info("chat_id=%s — /start", chat_id)
-        self._histories.pop(chat_id, None)
-        self._consent_given.pop(chat_id, None)
-        self._pending_consent_text.pop(chat_id, None)
 
-        greeting_photo: bytes | None = None
+        greeting_photo: DriveFile | None = None
         if self._greeting_image_url:
-            _, images = self._sheets_client.download_examples(self._greeting_image_url)
+            images = await self._sheets_client.download_examples(self._greeting_image_url)
             if images:
                 greeting_photo = images[0]
 
-        await self._handle_user_text(
-            chat_id, "Начать", message, first_message_photo=greeting_photo,
-        )
+        async with self._chat_scheduler.lock(chat_id):
+            await self._state_store.delete(chat_id)
+            await self._handle_user_text(
+                chat_id, "Начать", message, first_message_photo=greeting_photo, cacheable=True,
+            )
 
     async def _on_message(self, message: types.Message) -> None:
         if not message.text:
             return
-        await self._handle_user_text(message.chat.id, message.text, message)
+        await self._chat_scheduler.submit(
+            message.chat.id, message.text, message, self._handle_user_text,
+        )
 
     async def _on_callback(self, callback: types.CallbackQuery) -> None:
         if not callback.data or not callback.message:
             return
-        raw = self._button_map.pop(callback.data, callback.data)
+        raw = await self._callback_store.get(callback.data)
         chat_id = callback.message.chat.id
+        if raw is None:
+            logger.info("chat_id=%s — устаревшая кнопка", chat_id)
+            await callback.answer("Кнопка устарела, выберите вариант из последнего сообщения.")
+            return
         await callback.answer()
 
         if raw == _CONSENT_AGREE:
-            await self._on_consent_agree(callback.message)
+            async with self._chat_scheduler.lock(chat_id):
+                await self._on_consent_agree(callback.message)
             return
         if raw == _CONSENT_DECLINE:
-            await self._on_consent_decline(callback.message)
+            async with self._chat_scheduler.lock(chat_id):
+                await self._on_consent_decline(callback.message)
             return
 
         if raw == _BEST_EXAMPLE:
@@ -117,7 +173,10 @@ class Handler:
 
         logger.info("chat_id=%s — кнопка: %s", chat_id, raw)
         await callback.message.answer(f"👆 {raw}")
-        await self._handle_user_text(chat_id, raw, callback.message)
+        await self._chat_scheduler.submit(
+            chat_id, raw, callback.message,
+            functools.partial(self._handle_user_text, cacheable=True, button=True),
+        )
 
     def _is_order_intent(self, text: str) -> bool:
         t = text.lower().strip()
@@ -131,39 +190,106 @@ class Handler:
         text: str,
         target: types.Message,
         *,
-        first_message_photo: bytes | None = None,
+        first_message_photo: DriveFile | None = None,
+        cacheable: bool = False,
+        button: bool = False,
     ) -> None:
+        """cacheable — ответ можно взять из кеша и сохранить в него (одинаковые промт и история).
+
+        button — текст нажатой кнопки: на него всегда можно ответить шаблоном IntentRouter.
+        """
         logger.info("chat_id=%s — сообщение: %s", chat_id, text[:50])
 
+        state = await self._state_store.load(chat_id)
         if (
             self._consent_data_pdf_url
             and self._consent_advertising_pdf_url
             and self._is_order_intent(text)
-            and not self._consent_given.get(chat_id)
+            and not state.consent_given
         ):
-            self._pending_consent_text[chat_id] = text
-            await self._send_consent_request(target)
+            if await self._send_consent_request(target):
+                state.pending_consent_text = text
+                await self._state_store.save(chat_id, state)
             return
 
-        history = self._histories.setdefault(chat_id, [])
-        history.append({"role": "user", "content": text})
-
-        messages = self._prompt.build(history)
-        answer = await self._llm_client.complete(messages)
+        # Шаблон — на кнопку, первое сообщение или ответ на шаблон; посреди диалога с LLM короткий
+        # текст («Логотип» на «какая услуга нужна?») продолжает разговор и уходит в LLM
+        routable = button or state.template_answer or not (state.history or state.summary)
+        state.history.append({"role": "user", "content": text})
+
+        placeholder: types.Message | None = None
+        cache_key: str | None = None
+        answer = self._intent_router.answer(text) if routable else None
+        state.template_answer = answer is not None
+        if answer is not None:
+            logger.info("chat_id=%s — ответ по шаблону, без LLM", chat_id)
+        else:
+            messages = self._prompt.build(state.history, state.summary)
+            cache_key = ResponseCache.key(messages, self._llm_model) if cacheable else None
+            answer = self._response_cache.get(cache_key) if cache_key else None
+            if answer is not None:
+                logger.info("chat_id=%s — ответ из кеша", chat_id)
+            else:
+                async with self._llm_limiter.slot(chat_id):
+                    if self._llm_streaming and first_message_photo is None:
+                        answer, placeholder = await self._stream_answer(target, messages)
+                    else:
+                        answer = await self._llm_client.complete(messages)
+                if cache_key:
+                    self._response_cache.put(cache_key, answer)
 
-        history.append({"role": "assistant", "content": answer})
-        self._trim_history(chat_id)
+        state.history.append({"role": "assistant", "content": answer})
+        await self._state_store.save(chat_id, state)
 
         await self._try_save_order(answer, target)
         clean_answer = _ORDER_RE.sub("", answer).strip()
         body, keyboard = self._parse_buttons(clean_answer, text)
 
         if first_message_photo is not None:
-            photo = BufferedInputFile(first_message_photo, filename="greeting.jpg")
-            await target.answer_photo(photo, caption=body, reply_markup=keyboard)
+            await self._send_photo(
+                target, first_message_photo, "greeting.jpg", caption=body, reply_markup=keyboard,
+            )
+        elif placeholder is not None:
+            await self._edit_text(placeholder, body, reply_markup=keyboard)
         else:
             await target.answer(body, reply_markup=keyboard)
 
+        # Сжатие истории — после ответа, чтобы пользователь не ждал запроса за сводкой
+        if await self._history_compressor.compress(state, chat_id):
+            await self._state_store.save(chat_id, state)
+
+    async def _stream_answer(
+        self, target: types.Message, messages: list[dict[str, Any]],
+    ) -> tuple[str, types.Message | None]:
+        """Потоковый ответ LLM: первое сообщение — с первым видимым текстом, дальше правки не чаще STREAM_EDIT_INTERVAL."""
+        await target.bot.send_chat_action(target.chat.id, "typing")
+        buffer = StreamTextBuffer()
+        placeholder: types.Message | None = None
+        shown = ""
+        last_edit = 0.0
+        async for delta in self._llm_client.stream(messages):
+            buffer.feed(delta)
+            visible = buffer.visible()
+            if not visible or visible == shown:
+                continue
+            if time.monotonic() - last_edit < self._stream_edit_interval:
+                continue
+            if placeholder is None:
+                placeholder = await target.answer(visible)
+            else:
+                await self._edit_text(placeholder, visible)
+            shown = visible
+            last_edit = time.monotonic()
+        return buffer.text, placeholder
+
+    async def _edit_text(self, message: types.Message, text: str, **kwargs: Any) -> None:
+        try:
+            await message.edit_text(text, **kwargs)
+        except TelegramBadRequest as e:
+            # Текст не изменился — Telegram отвечает ошибкой, это не сбой
+            if "message is not modified" not in str(e):
+                raise
+
     def _parse_buttons(
         self, text: str, user_text: str,
     ) -> tuple[str, InlineKeyboardMarkup | None]:
@@ -178,23 +304,22 @@ class Handler:
 
         buttons: list[list[InlineKeyboardButton]] = []
         for label in lines:
-            key = uuid.uuid4().hex[:12]
             label_lower = label.lower().strip()
             if label_lower in ("примеры работ", "посмотреть примеры работ"):
-                self._button_map[key] = _BEST_EXAMPLE
+                key = self._callback_store.put(_BEST_EXAMPLE)
                 buttons.append([InlineKeyboardButton(text=f"📸 {label}", callback_data=key)])
             elif label_lower == "показать пример":
                 url = self._sheets_client.find_example_url(user_text)
                 if url:
-                    self._button_map[key] = f"{_EXAMPLE_PREFIX}{url}"
+                    key = self._callback_store.put(f"{_EXAMPLE_PREFIX}{url}")
                     buttons.append([
                         InlineKeyboardButton(text="📸 Показать пример", callback_data=key),
                     ])
                 else:
-                    self._button_map[key] = label
+                    key = self._callback_store.put(label)
                     buttons.append([InlineKeyboardButton(text=label, callback_data=key)])
             else:
-                self._button_map[key] = label
+                key = self._callback_store.put(label)
                 buttons.append([InlineKeyboardButton(text=label, callback_data=key)])
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -218,9 +343,10 @@ class Handler:
         telegram_id = target.chat.username or ""
         chat_id = target.chat.id
 
+        row = OrderWriter.build_row(client_name, email, service, comment, telegram_id, chat_id)
         try:
-            self._order_writer.write(client_name, email, service, comment, telegram_id, chat_id)
-            logger.info("chat_id=%s — заявка сохранена", target.chat.id)
+            await self._order_queue.submit(row)
+            logger.info("chat_id=%s — заявка принята в очередь", target.chat.id)
         except Exception:
             logger.exception("chat_id=%s — ошибка записи заявки", target.chat.id)
             await target.answer("Произошла ошибка при сохранении заявки. Попробуйте позже.")
@@ -241,33 +367,30 @@ class Handler:
             except Exception:
                 logger.exception("chat_id=%s — ошибка отправки уведомления в Telegram", target.chat.id)
 
-    async def _send_consent_request(self, target: types.Message) -> None:
+    async def _send_consent_request(self, target: types.Message) -> bool:
         chat_id = target.chat.id
-        _, parts1 = self._sheets_client.download_examples(self._consent_data_pdf_url)
-        _, parts2 = self._sheets_client.download_examples(self._consent_advertising_pdf_url)
+        parts1 = await self._sheets_client.download_examples(self._consent_data_pdf_url)
+        parts2 = await self._sheets_client.download_examples(self._consent_advertising_pdf_url)
         pdf1 = parts1[0] if parts1 else None
         pdf2 = parts2[0] if parts2 else None
         if not pdf1 or not pdf2:
             logger.warning("chat_id=%s — не удалось загрузить PDF согласия", chat_id)
-            self._pending_consent_text.pop(chat_id, None)
             await target.answer(
                 "Не удалось загрузить документы для ознакомления. Попробуйте позже."
             )
-            return
+            return False
 
-        await target.answer_document(
-            BufferedInputFile(pdf1, filename="soglasie_obrabotka_dannyh.pdf"),
+        await self._send_document(
+            target, pdf1, "soglasie_obrabotka_dannyh.pdf",
             caption="Согласие на обработку персональных данных",
         )
-        await target.answer_document(
-            BufferedInputFile(pdf2, filename="soglasie_rassylka.pdf"),
+        await self._send_document(
+            target, pdf2, "soglasie_rassylka.pdf",
             caption="Согласие на рассылку рекламных материалов",
         )
 
-        key_agree = uuid.uuid4().hex[:12]
-        key_decline = uuid.uuid4().hex[:12]
-        self._button_map[key_agree] = _CONSENT_AGREE
-        self._button_map[key_decline] = _CONSENT_DECLINE
+        key_agree = self._callback_store.put(_CONSENT_AGREE)
+        key_decline = self._callback_store.put(_CONSENT_DECLINE)
         keyboard = InlineKeyboardMarkup(
             inline_keyboard=[
                 [
@@ -282,11 +405,15 @@ class Handler:
             reply_markup=keyboard,
         )
         logger.info("chat_id=%s — отправлены PDF согласия, ожидание ответа", chat_id)
+        return True
 
     async def _on_consent_agree(self, message: types.Message) -> None:
         chat_id = message.chat.id
-        pending = self._pending_consent_text.pop(chat_id, "")
-        self._consent_given[chat_id] = True
+        state = await self._state_store.load(chat_id)
+        pending = state.pending_consent_text
+        state.pending_consent_text = ""
+        state.consent_given = True
+        await self._state_store.save(chat_id, state)
         logger.info("chat_id=%s — пользователь дал согласие", chat_id)
         await message.answer("👆 Согласен")
         if pending:
@@ -294,7 +421,10 @@ class Handler:
 
     async def _on_consent_decline(self, message: types.Message) -> None:
         chat_id = message.chat.id
-        self._pending_consent_text.pop(chat_id, None)
+        state = await self._state_store.load(chat_id)
+        if state.pending_consent_text:
+            state.pending_consent_text = ""
+            await self._state_store.save(chat_id, state)
         logger.info("chat_id=%s — пользователь отказался от согласия", chat_id)
         await message.answer(
             "Хорошо. Без согласия мы не можем принять заявку. "
@@ -302,18 +432,21 @@ class Handler:
         )
 
     async def _send_examples(self, target: types.Message, drive_url: str) -> None:
-        raw_description, images = self._sheets_client.download_examples(drive_url)
+        state = await self._state_store.load(target.chat.id)
+        # Подпись (из кеша или от LLM) готовится параллельно с загрузкой картинок
+        (raw_description, caption_raw), images = await asyncio.gather(
+            self._example_caption(target.chat.id, state, drive_url),
+            self._sheets_client.download_examples(drive_url),
+        )
         if not raw_description and not images:
             await target.answer("К сожалению, не удалось загрузить примеры.")
             return
         caption_text: str | None = None
         caption_keyboard: InlineKeyboardMarkup | None = None
         if raw_description and images:
-            caption_raw = await self._caption_from_description(target.chat.id, raw_description)
             if caption_raw:
-                history = self._histories.get(target.chat.id, [])
                 last_user = next(
-                    (m["content"] for m in reversed(history) if m["role"] == "user"),
+                    (m["content"] for m in reversed(state.history) if m["role"] == "user"),
                     "",
                 )
                 caption_text, caption_keyboard = self._parse_buttons(caption_raw, last_user)
@@ -324,35 +457,101 @@ class Handler:
             await target.answer(raw_description)
             return
         if len(images) == 1:
-            photo = BufferedInputFile(images[0], filename="example.jpg")
-            await target.answer_photo(
-                photo, caption=caption_text, reply_markup=caption_keyboard
+            await self._send_photo(
+                target, images[0], "example.jpg",
+                caption=caption_text, reply_markup=caption_keyboard,
             )
             return
+        await self._send_media_group(target, images, caption_text)
+        if caption_keyboard:
+            await target.answer("Что делаем дальше?", reply_markup=caption_keyboard)
+
+    async def _send_photo(
+        self, target: types.Message, image: DriveFile, filename: str,
+        **kwargs: Any,
+    ) -> None:
+        key = self._file_registry.key("photo", image)
+        file_id = self._file_registry.get(key)
+        if file_id:
+            try:
+                await target.answer_photo(file_id, **kwargs)
+                return
+            except TelegramBadRequest:
+                logger.warning("file_id для %s недействителен, загружаем заново", image.id)
+                self._file_registry.forget(key)
+        sent = await target.answer_photo(BufferedInputFile(image.data, filename=filename), **kwargs)
+        if sent.photo:
+            self._file_registry.put(key, sent.photo[-1].file_id)
+
+    async def _send_document(
+        self, target: types.Message, document: DriveFile, filename: str,
+        **kwargs: Any,
+    ) -> None:
+        key = self._file_registry.key("document", document)
+        file_id = self._file_registry.get(key)
+        if file_id:
+            try:
+                await target.answer_document(file_id, **kwargs)
+                return
+            except TelegramBadRequest:
+                logger.warning("file_id для %s недействителен, загружаем заново", document.id)
+                self._file_registry.forget(key)
+        sent = await target.answer_document(
+            BufferedInputFile(document.data, filename=filename), **kwargs,
+        )
+        if sent.document:
+            self._file_registry.put(key, sent.document.file_id)
+
+    async def _send_media_group(
+        self, target: types.Message, images: list[DriveFile], caption: str | None,
+    ) -> None:
+        keys = [self._file_registry.key("photo", image) for image in images]
+        file_ids = [self._file_registry.get(key) for key in keys]
+        if all(file_ids):
+            media = [
+                InputMediaPhoto(media=file_id, caption=caption if i == 0 else None)
+                for i, file_id in enumerate(file_ids)
+            ]
+            try:
+                await target.answer_media_group(media)
+                return
+            except TelegramBadRequest:
+                logger.warning("file_id в альбоме недействительны, загружаем заново")
+                for key in keys:
+                    self._file_registry.forget(key)
         media = [
             InputMediaPhoto(
-                media=BufferedInputFile(data, filename=f"example_{i}.jpg"),
-                caption=caption_text if i == 0 else None,
+                media=BufferedInputFile(image.data, filename=f"example_{i}.jpg"),
+                caption=caption if i == 0 else None,
             )
-            for i, data in enumerate(images)
+            for i, image in enumerate(images)
         ]
-        await target.answer_media_group(media)
-        if caption_keyboard:
-            await target.answer("Что делаем дальше?", reply_markup=caption_keyboard)
-
-    async def _caption_from_description(self, chat_id: int, description: str) -> str | None:
+        sent = await target.answer_media_group(media)
+        for key, message in zip(keys, sent):
+            if message.photo:
+                self._file_registry.put(key, message.photo[-1].file_id)
+
+    async def _example_caption(
+        self, chat_id: int, state: ChatState, drive_url: str,
+    ) -> tuple[str, str | None]:
+        """Описание папки примеров и подпись к ней: общая из CaptionCache или с учётом истории чата."""
+        key, description = await self._sheets_client.example_description(drive_url)
+        if not description:
+            return "", None
+        if self._caption_personalized:
+            return description, await self._caption_from_description(chat_id, state, description)
+        return description, await self._caption_cache.get(key, description)
+
+    async def _caption_from_description(
+        self, chat_id: int, state: ChatState, description: str,
+    ) -> str | None:
         """Подпись к примерам: тот же запрос к LLM, что и в диалоге (системный промпт + история), плюс описание примера из Google Doc."""
-        history = self._histories.get(chat_id, [])
-        messages = self._prompt.build(history)
+        messages = self._prompt.build(state.history, state.summary)
         messages.append({"role": "user", "content": description.strip()})
         try:
-            text = await self._llm_client.complete(messages)
+            async with self._llm_limiter.slot(chat_id):
+                text = await self._llm_client.complete(messages, model=self._caption_model)
             return text.strip() if text else None
         except Exception:
             logger.exception("Ошибка генерации подписи к примеру")
             return None
-
-    def _trim_history(self, chat_id: int) -> None:
-        history = self._histories.get(chat_id)
-        if history and len(history) > self._max_history:
-            self._histories[chat_id] = history[-self._max_history:]
@@ -0,0 +1,104 @@
+import logging
+import math
+import re
+from collections.abc import Hashable
+
+from bot.chat_state import ChatState
+from bot.config import Config
+from bot.fair_limiter import FairLimiter
+from bot.llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Служебные токены на одно сообщение (роль, разделители)
+_MESSAGE_OVERHEAD = 4
+# Символов слова на один токен (для кириллицы токенизаторы дробят слова сильнее, чем для латиницы)
+_CHARS_PER_TOKEN = 3
+
+SUMMARY_INSTRUCTION = """
+Ты ведёшь краткую сводку диалога менеджера с клиентом. Обнови сводку, добавив в неё новые сообщения.
+Обязательно сохрани: имя клиента, интересующие услуги, цены и сроки, которые обсуждались, email, пожелания,
+договорённости и на каком шаге остановился диалог. Пиши кратко, по пунктам, не более 150 слов.
+Верни только текст сводки.
+""".strip()
+
+
+class HistoryCompressor:
+    """Ограничивает историю диалога бюджетом токенов.
+
+    Старые сообщения, не помещающиеся в бюджет, сжимаются LLM в накопительную сводку
+    (хранится в ChatState.summary), а не отбрасываются. Слот общей очереди LLM занимается
+    только на время запроса за сводкой — история в бюджете обходится без очереди.
+    """
+
+    def __init__(self, config: Config, llm_client: LLMClient, llm_limiter: FairLimiter) -> None:
+        self._llm_client = llm_client
+        self._llm_limiter = llm_limiter
+        self._token_budget = config.history_token_budget
+        self._max_messages = config.max_history_messages
+        self._summary_model = config.summary_model
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Оценка числа токенов без внешнего токенизатора."""
+        return sum(
+            math.ceil(len(piece) / _CHARS_PER_TOKEN) for piece in _TOKEN_RE.findall(text)
+        )
+
+    def history_tokens(self, history: list[dict[str, str]]) -> int:
+        return sum(self.estimate_tokens(m["content"]) + _MESSAGE_OVERHEAD for m in history)
+
+    async def compress(self, state: ChatState, key: Hashable) -> bool:
+        """Сжимает историю, если она не помещается в бюджет. True — если состояние изменилось.
+
+        key — ключ очереди LLM (chat_id) для запроса за сводкой.
+        """
+        tokens = self.history_tokens(state.history) + self.estimate_tokens(state.summary)
+        if tokens <= self._token_budget and len(state.history) <= self._max_messages:
+            return False
+
+        # Свежие сообщения занимают не больше половины бюджета (но не меньше последней пары),
+        # остальные уходят в сводку
+        keep_budget = self._token_budget // 2
+        keep = 0
+        kept_tokens = 0
+        for message in reversed(state.history):
+            cost = self.estimate_tokens(message["content"]) + _MESSAGE_OVERHEAD
+            if keep >= 2 and (kept_tokens + cost > keep_budget or keep >= self._max_messages // 2):
+                break
+            keep += 1
+            kept_tokens += cost
+        split = len(state.history) - keep
+        if split <= 0:
+            return False
+
+        overflow, recent = state.history[:split], state.history[split:]
+        async with self._llm_limiter.slot(key):
+            summary = await self._summarize(state.summary, overflow)
+        if summary is not None:
+            state.summary = summary
+        state.history = recent
+        logger.info(
+            "История сжата: %d сообщений в сводку, осталось %d, токенов было ~%d",
+            len(overflow), len(recent), tokens,
+        )
+        return True
+
+    async def _summarize(self, summary: str, messages: list[dict[str, str]]) -> str | None:
+        dialog = "\n".join(
+            f"{'Клиент' if m['role'] == 'user' else 'Менеджер'}: {m['content']}" for m in messages
+        )
+        content = f"Текущая сводка:\n{summary or '—'}\n\nНовые сообщения:\n{dialog}"
+        try:
+            text = await self._llm_client.complete(
+                [
+                    {"role": "system", "content": SUMMARY_INSTRUCTION},
+                    {"role": "user", "content": content},
+                ],
+                model=self._summary_model,
+            )
+        except Exception:
+            logger.exception("Ошибка сжатия истории, старые сообщения отброшены без сводки")
+            return None
+        return text.strip() or None
@@ -0,0 +1,42 @@
+import logging
+
+from aiohttp import web
+
+from bot.config import Config
+from bot.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HttpServer:
+    """Локальный HTTP-сервер: вебхук Telegram и служебные эндпоинты (/health, /metrics)."""
+
+    def __init__(self, config: Config) -> None:
+        self._host = config.http_host
+        self._port = config.http_port
+        self.app = web.Application()
+        self.app.router.add_get("/health", self._on_health)
+        self.app.router.add_get("/metrics", self._on_metrics)
+        self._runner: web.AppRunner | None = None
+        # False — экземпляр останавливается: балансировщик перестаёт слать на него запросы
+        self.healthy = True
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        logger.info("HTTP-сервер слушает %s:%s", self._host, self._port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("HTTP-сервер остановлен")
+
+    async def _on_health(self, request: web.Request) -> web.Response:
+        if not self.healthy:
+            return web.Response(status=503, text="stopping")
+        return web.Response(text="ok")
+
+    async def _on_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
@@ -0,0 +1,101 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def _recompress(data: bytes, max_side: int, fmt: str, quality: int) -> bytes:
+    """Уменьшение до max_side по большей стороне и пересжатие без метаданных (в отдельном процессе)."""
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+            # Прозрачность в JPEG недоступна — подкладываем белый фон
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        out = io.BytesIO()
+        # EXIF, ICC и прочие метаданные не передаются — save пишет только пиксели
+        if fmt == "JPEG":
+            image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(out, "WEBP", quality=quality, method=6)
+    return out.getvalue()
+
+
+class ImageProcessor:
+    """Подготовка картинок-примеров к отправке: уменьшение, пересжатие, удаление метаданных.
+
+    Работает в пуле процессов, чтобы не занимать event loop и GIL.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._max_side = config.image_max_side
+        self._format = config.image_format.upper()
+        self._quality = config.image_quality
+        self.enabled = config.image_processing
+        self._workers = config.image_workers
+        self._executor: ProcessPoolExecutor | None = None
+        if self.enabled:
+            # Не fork многопоточного бота: процесс пула унаследовал бы каналы subprocess,
+            # запущенного в этот момент в другом потоке, и тот вызов завис бы. Сервер forkserver
+            # импортирует только этот модуль (Pillow), процессы пула ответвляются от него
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+            self._executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=context)
+        self._warm_task: asyncio.Task | None = None
+
+    @property
+    def variant(self) -> str:
+        """Метка параметров обработки — часть ключа кеша, при смене настроек кеш не путается."""
+        return f"{self._format.lower()}{self._max_side}q{self._quality}"
+
+    @property
+    def mime_type(self) -> str:
+        return _MIME_TYPES[self._format]
+
+    def start(self) -> None:
+        """Запуск процессов пула в фоне: приём апдейтов его не ждёт, первая обработка — дожидается.
+
+        Пул запускает процессы внутри submit и ждёт сервер forkserver — это делается в потоке,
+        чтобы event loop не ждал.
+        """
+        if self._executor is None or self._warm_task is not None:
+            return
+        self._warm_task = asyncio.create_task(asyncio.to_thread(self._start_workers))
+
+    def _start_workers(self) -> None:
+        # Пул добавляет процесс на каждую задачу, пока нет свободного, — по задаче на процесс
+        for future in [self._executor.submit(int) for _ in range(self._workers)]:
+            future.result()
+
+    async def process(self, data: bytes) -> bytes:
+        """Обработанная картинка; при ошибке (повреждённый файл) — исходные байты."""
+        if self._executor is None:
+            return data
+        loop = asyncio.get_running_loop()
+        try:
+            if self._warm_task is not None:
+                await asyncio.shield(self._warm_task)
+            result = await loop.run_in_executor(
+                self._executor, _recompress, data, self._max_side, self._format, self._quality,
+            )
+        except Exception:
+            logger.warning("Не удалось обработать картинку, отправляем как есть", exc_info=True)
+            return data
+        logger.info("Картинка обработана: %d → %d байт", len(data), len(result))
+        return result
+
+    def close(self) -> None:
+        if self._executor is not None:
+            # Дожидаемся текущих задач: иначе процессы пула обрываются на выходе интерпретатора
+            self._executor.shutdown(wait=True, cancel_futures=True)
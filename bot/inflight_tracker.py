@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+class InflightTracker(BaseMiddleware):
+    """Внешний middleware апдейтов: считает обрабатываемые апдейты, чтобы дождаться их при остановке."""
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        self._count += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self._count -= 1
+            if not self._count:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Ждёт завершения всех апдейтов; False — если не успели за timeout (сек)."""
+        if self._count:
+            logger.info("Ожидание обработки апдейтов: %d", self._count)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не дождались обработки апдейтов: %d", self._count)
+            return False
+        return True
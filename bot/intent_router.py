@@ -0,0 +1,152 @@
+import re
+
+from bot.config import Config
+from bot.service_index import ServiceIndex
+from bot.sheets_client import SheetsClient
+
+# Больше кнопок услуг под перечнем — уже неудобно листать
+_MAX_SERVICE_BUTTONS = 10
+# Слова, которые не меняют смысл короткого сообщения («А какая цена у логотипа?»)
+_FILLER_WORDS = frozenset({
+    "а", "и", "в", "на", "по", "за", "у", "о", "об", "про", "мне", "нам",
+    "вас", "ваш", "ваша", "ваши", "есть", "это",
+    "какая", "какой", "какие", "каков", "какова", "скажите", "подскажите", "пожалуйста",
+})
+_WORD_RE = re.compile(r"\w+")
+
+
+class IntentRouter:
+    """Ответы на частые вопросы без LLM: перечень услуг с ценами, карточка услуги, цена и сроки.
+
+    Короткий текст классифицируется по ключевым словам (INTENT_*_KEYWORDS, целые слова) и названиям
+    услуг из ServiceIndex. Ответ — шаблон по таблице услуг в том же формате, что у LLM (с блоком
+    [buttons]), поэтому дальше обрабатывается так же. Всё остальное уходит в LLM: вопрос о незаполненном
+    поле таблицы, сообщение с INTENT_SKIP_KEYWORDS (почему, скидка, дорого) и сообщение, в котором кроме
+    ключевых слов и названия услуги есть другие слова («Логотип, срок неважен»).
+
+    Вызывается только вне разговора с LLM (решает Handler): нажатие кнопки, первое сообщение или ответ
+    на шаблон. Посреди диалога короткое «Логотип» — ответ на вопрос LLM, а не запрос карточки.
+    """
+
+    def __init__(self, config: Config, sheets_client: SheetsClient) -> None:
+        self._enabled = config.intent_router
+        self._max_words = config.intent_max_words
+        self._sheets_client = sheets_client
+        self._price_list = self._compile(config.intent_price_list_keywords)
+        self._price = self._compile(config.intent_price_keywords)
+        self._deadline = self._compile(config.intent_deadline_keywords)
+        self._details = self._compile(config.intent_details_keywords)
+        self._skip = self._compile(config.intent_skip_keywords, prefix=True)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def answer(self, text: str) -> str | None:
+        """Ответ по шаблону или None, если вопрос нужно отдать LLM."""
+        if not self._enabled:
+            return None
+        result = self._route(ServiceIndex.normalize(text), text)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def _route(self, normalized: str, text: str) -> str | None:
+        if not normalized or len(normalized.split()) > self._max_words:
+            return None
+        # Вопрос «почему», возражение, просьба о скидке — шаблон с ценой на них не отвечает
+        if self._matches(self._skip, normalized):
+            return None
+        service = self._sheets_client.find_service(text)
+        if self._has_extra_words(normalized, service):
+            return None
+        if service is not None:
+            if self._matches(self._deadline, normalized):
+                return self._service_field(service, "Сроки", "Сроки по услуге")
+            if self._matches(self._price, normalized):
+                return self._service_field(service, "Цена", "Стоимость услуги")
+            name = ServiceIndex.normalize(str(service.get("Название", "")))
+            if normalized == name or self._matches(self._details, normalized):
+                return self._service_card(service)
+            return None
+        if self._matches(self._price_list, normalized) or self._matches(self._price, normalized):
+            return self._services_list("Услуги и цены:", "Цена")
+        if self._matches(self._deadline, normalized):
+            return self._services_list("Сроки выполнения:", "Сроки")
+        return None
+
+    def _has_extra_words(self, normalized: str, service: dict[str, str] | None) -> bool:
+        """Есть ли в тексте слова помимо ключевых, названия услуги и служебных."""
+        rest = normalized
+        for pattern in (self._price_list, self._price, self._deadline, self._details):
+            if pattern is not None:
+                rest = pattern.sub(" ", rest)
+        if service is not None and (name := ServiceIndex.normalize(str(service.get("Название", "")))):
+            # Название входит в текст и в другой форме («логотипа») — слово убирается целиком
+            rest = re.sub(rf"\w*{re.escape(name)}\w*", " ", rest)
+        return any(word not in _FILLER_WORDS for word in _WORD_RE.findall(rest))
+
+    def _services_list(self, title: str, field: str) -> str | None:
+        services = [s for s in self._sheets_client.services if str(s.get("Название", "")).strip()]
+        if not services or not any(str(s.get(field, "")).strip() for s in services):
+            return None
+        lines = []
+        for s in services:
+            value = str(s.get(field, "")).strip()
+            name = str(s["Название"]).strip()
+            lines.append(f"• {name} — {value}" if value else f"• {name}")
+        buttons = [str(s["Название"]).strip() for s in services[:_MAX_SERVICE_BUTTONS]]
+        buttons.append("Примеры работ")
+        body = f"{title}\n\n" + "\n".join(lines) + "\n\nВыберите услугу, чтобы узнать подробности."
+        return self._with_buttons(body, buttons)
+
+    def _service_card(self, service: dict[str, str]) -> str:
+        parts = [str(service.get("Название", "")).strip()]
+        if description := str(service.get("Описание", "")).strip():
+            parts.append(description)
+        details = [
+            f"{label}: {value}"
+            for label, value in (("Цена", service.get("Цена", "")), ("Сроки", service.get("Сроки", "")))
+            if str(value).strip()
+        ]
+        if details:
+            parts.append("\n".join(details))
+        return self._with_buttons("\n\n".join(parts), self._service_buttons(service))
+
+    def _service_field(self, service: dict[str, str], field: str, label: str) -> str | None:
+        value = str(service.get(field, "")).strip()
+        if not value:
+            return None
+        name = str(service.get("Название", "")).strip()
+        return self._with_buttons(f"{label} «{name}»: {value}", self._service_buttons(service))
+
+    @staticmethod
+    def _service_buttons(service: dict[str, str]) -> list[str]:
+        buttons = []
+        if str(service.get("Пример (ссылка)", "")).strip():
+            buttons.append("Показать пример")
+        buttons += ["Оставить заявку", "Услуги и цены"]
+        return buttons
+
+    @staticmethod
+    def _with_buttons(body: str, buttons: list[str]) -> str:
+        return body + "\n\n[buttons]\n" + "\n".join(buttons) + "\n[/buttons]"
+
+    @staticmethod
+    def _compile(keywords: list[str], prefix: bool = False) -> re.Pattern[str] | None:
+        """Целые слова (или, при prefix, начала слов); длинные фразы — первыми."""
+        if not keywords:
+            return None
+        normalized = sorted({ServiceIndex.normalize(k) for k in keywords}, key=len, reverse=True)
+        alternatives = "|".join(re.escape(k) for k in normalized)
+        end = "" if prefix else r"(?!\w)"
+        return re.compile(rf"(?<!\w)(?:{alternatives}){end}")
+
+    @staticmethod
+    def _matches(pattern: re.Pattern[str] | None, normalized: str) -> bool:
+        return pattern is not None and pattern.search(normalized) is not None
@@ -1,31 +1,219 @@
+import asyncio
 import logging
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from typing import Any
 
+import openai
 from openai import AsyncOpenAI
 
 from bot.config import Config
+from bot.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Сколько последних задержек учитывать для порога дублирующего запроса и минимум для расчёта
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+
 
 class LLMClient:
     def __init__(self, config: Config) -> None:
+        # Повторы и таймауты выполняются здесь, встроенные повторы клиента openai отключены
         if config.openai_api_key:
-            self._client = AsyncOpenAI(api_key=config.openai_api_key)
+            self._client = AsyncOpenAI(
+                api_key=config.openai_api_key, base_url=config.llm_base_url, max_retries=0,
+            )
             logger.info("LLM: OpenAI (напрямую), модель %s", config.llm_model)
         else:
             self._client = AsyncOpenAI(
                 api_key=config.openrouter_api_key,
-                base_url="https://openrouter.ai/api/v1",
+                base_url=config.llm_base_url or "https://openrouter.ai/api/v1",
+                max_retries=0,
             )
             logger.info("LLM: OpenRouter, модель %s", config.llm_model)
+        if config.llm_base_url:
+            logger.info("LLM: адрес API %s", config.llm_base_url)
         self._model = config.llm_model
+        self._fallback_models = config.llm_fallback_models
+        self._timeout = config.llm_timeout
+        self._max_retries = config.llm_max_retries
+        self._retry_base_delay = config.llm_retry_base_delay
+        self._hedge_percentile = config.llm_hedge_percentile
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
 
-    async def complete(self, messages: list[dict[str, str]]) -> str:
+    async def complete(
+        self, messages: list[dict[str, Any]], model: str | None = None,
+    ) -> str:
         logger.info("Запрос к LLM, сообщений: %d", len(messages))
-        response = await self._client.chat.completions.create(
-            model=self._model,
-            messages=messages,
+        last_error: Exception | None = None
+        for current_model in self._models(model):
+            for attempt in range(self._max_retries + 1):
+                started = time.monotonic()
+                try:
+                    response = await self._complete_hedged(messages, current_model)
+                except Exception as e:
+                    last_error = e
+                    self._log_attempt(current_model, attempt, started, e)
+                    if not self._is_retryable(e):
+                        break
+                    if attempt < self._max_retries:
+                        await asyncio.sleep(self._backoff(attempt))
+                    continue
+                self._log_attempt(current_model, attempt, started)
+                self._latencies.append(time.monotonic() - started)
+                text = response.choices[0].message.content or ""
+                logger.info("Ответ LLM получен, длина: %d", len(text))
+                self._record_usage(response.usage)
+                return text
+        assert last_error is not None
+        raise last_error
+
+    async def stream(
+        self, messages: list[dict[str, Any]], model: str | None = None,
+    ) -> AsyncIterator[str]:
+        """Потоковый ответ: отдаёт фрагменты текста по мере генерации.
+
+        Повторы и переход на резервную модель возможны только до первого фрагмента.
+        """
+        logger.info("Потоковый запрос к LLM, сообщений: %d", len(messages))
+        last_error: Exception | None = None
+        for current_model in self._models(model):
+            for attempt in range(self._max_retries + 1):
+                started = time.monotonic()
+                length = 0
+                response = None
+                try:
+                    response = await asyncio.wait_for(
+                        self._client.chat.completions.create(
+                            model=current_model,
+                            messages=messages,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                        ),
+                        self._timeout,
+                    )
+                    chunks = response.__aiter__()
+                    while True:
+                        # Таймаут на каждый фрагмент — зависший поток не держит пользователя
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), self._timeout)
+                        except StopAsyncIteration:
+                            break
+                        if chunk.usage:
+                            self._record_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not length:
+                                self._latencies.append(time.monotonic() - started)
+                            length += len(delta)
+                            yield delta
+                except Exception as e:
+                    self._log_attempt(current_model, attempt, started, e)
+                    if length:
+                        raise
+                    last_error = e
+                    if not self._is_retryable(e):
+                        break
+                    if attempt < self._max_retries:
+                        await asyncio.sleep(self._backoff(attempt))
+                    continue
+                finally:
+                    # Таймаут, ошибка или прерванное чтение — соединение не должно остаться открытым
+                    await self._close_stream(response)
+                self._log_attempt(current_model, attempt, started)
+                logger.info("Потоковый ответ LLM получен, длина: %d", length)
+                return
+        assert last_error is not None
+        raise last_error
+
+    @staticmethod
+    async def _close_stream(response: Any) -> None:
+        if response is not None:
+            await response.close()
+
+    def _models(self, model: str | None) -> list[str]:
+        return list(dict.fromkeys([model or self._model, *self._fallback_models]))
+
+    async def _request(self, messages: list[dict[str, Any]], model: str) -> Any:
+        return await asyncio.wait_for(
+            self._client.chat.completions.create(model=model, messages=messages),
+            self._timeout,
+        )
+
+    async def _complete_hedged(self, messages: list[dict[str, Any]], model: str) -> Any:
+        """Запрос; если ответа нет дольше обычного (перцентиль задержек) — дублирующий, берётся первый ответ."""
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._request(messages, model)
+
+        first = asyncio.create_task(self._request(messages, model))
+        pending = {first}
+        error: BaseException | None = None
+        # finally отменяет незавершённые запросы и при отмене самого вызова
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            logger.info("LLM: нет ответа за %.2f с, отправлен дублирующий запрос", delay)
+            pending.add(asyncio.create_task(self._request(messages, model)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        assert error is not None
+        raise error
+
+    def _hedge_delay(self) -> float | None:
+        if self._hedge_percentile <= 0 or len(self._latencies) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self._hedge_percentile))
+        return ordered[index]
+
+    def _backoff(self, attempt: int) -> float:
+        return self._retry_base_delay * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    @staticmethod
+    def _log_attempt(
+        model: str, attempt: int, started: float, error: Exception | None = None,
+    ) -> None:
+        elapsed = time.monotonic() - started
+        logger.info(
+            "LLM попытка %d: модель %s, %.2f с, результат: %s",
+            attempt + 1, model, elapsed, "ok" if error is None else repr(error),
+        )
+        outcome = "ok" if error is None else type(error).__name__
+        metrics.observe("llm_request_seconds", elapsed, model=model, outcome=outcome)
+
+    def _record_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        # Токены, взятые провайдером из кеша промта, — llm_tokens{kind="cached"} в /metrics
+        metrics.observe("llm_tokens", usage.prompt_tokens or 0, kind="prompt")
+        metrics.observe("llm_tokens", cached, kind="cached")
+        metrics.observe("llm_tokens", usage.completion_tokens or 0, kind="completion")
+        logger.info(
+            "Токены LLM: вход %d (из кеша %d), выход %d",
+            usage.prompt_tokens or 0, cached, usage.completion_tokens or 0,
         )
-        text = response.choices[0].message.content or ""
-        logger.info("Ответ LLM получен, длина: %d", len(text))
-        return text
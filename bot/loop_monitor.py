@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import signal
+import sys
+import threading
+import time
+import traceback
+import types
+from collections import deque
+from collections.abc import Awaitable, Callable, Coroutine, Generator
+from typing import Any
+
+from aiogram import BaseMiddleware, Dispatcher, F
+from aiogram.filters import Command
+from aiogram.types import Message, TelegramObject
+
+from bot.config import Config
+from bot.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сколько замеров задержки хранить для отчёта и сколько кадров стека снимать
+_LAG_SAMPLES = 1000
+_STACK_DEPTH = 12
+# В отчёте — самые долгие обработчики и самые частые блокирующие стеки
+_REPORT_HANDLERS = 15
+_REPORT_STACKS = 5
+_TELEGRAM_TEXT_LIMIT = 4000
+
+
+class LoopMonitor(BaseMiddleware):
+    """Диагностика event loop (DIAGNOSTICS_ENABLED): задержка цикла, блокирующие обработчики, время обработчиков.
+
+    Задача в цикле замеряет, насколько позже заданного просыпается asyncio.sleep. Сторожевой поток
+    каждые полпорога ставит в цикл свою отметку (call_soon_threadsafe); если цикл не выполнил её дольше
+    порога, снимает стек потока цикла (sys._current_frames) — так виден синхронный вызов, который его держит. Как внутренний middleware апдейтов считает по каждому
+    обработчику полное время и время CPU — только на шагах его корутины, без чужих задач.
+    Отчёт — в лог по SIGUSR1 и командой /diag администраторам.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._interval = config.diagnostics_lag_interval
+        self._threshold = config.diagnostics_block_threshold
+        self._admin_chat_ids = config.admin_chat_ids
+        self._title = f"Обработчик {config.worker_index}\n" if config.worker_index is not None else ""
+        self._lags: deque[float] = deque(maxlen=_LAG_SAMPLES)
+        # Обработчик → [вызовов, время всего, время макс., CPU всего, CPU макс., блокирующих шагов]
+        self._handlers: dict[str, list[float]] = {}
+        # (обработчик, стек) → число сэмплов; пишется из сторожевого потока
+        self._stacks: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._running: str | None = None
+        self._beat = 0.0
+        self._loop_thread_id = 0
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def register(self, dp: Dispatcher) -> None:
+        dp.message.register(
+            self._on_diag_command, Command("diag"), F.chat.id.in_(self._admin_chat_ids),
+        )
+        dp.message.middleware(self)
+        dp.callback_query.middleware(self)
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.create_task(self._measure_lag())
+        self._stopped.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(loop,), name="loop-watchdog", daemon=True,
+        )
+        self._watchdog.start()
+        if hasattr(signal, "SIGUSR1"):
+            loop.add_signal_handler(signal.SIGUSR1, self._dump)
+        logger.info(
+            "Диагностика event loop включена: замер раз в %.2f с, порог блокировки %.2f с",
+            self._interval, self._threshold,
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        callback = data["handler"].callback
+        name = getattr(callback, "__qualname__", type(event).__name__)
+        cpu = [0.0]
+        started = time.monotonic()
+        try:
+            return await self._profiled(handler(event, data), name, cpu)
+        finally:
+            self._record(name, time.monotonic() - started, cpu[0])
+
+    def report(self) -> str:
+        lags = sorted(self._lags)
+        lines = []
+        if lags:
+            p50 = lags[len(lags) // 2]
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+            lines.append(
+                f"Задержка event loop ({len(lags)} замеров): p50 {p50 * 1000:.1f} мс, "
+                f"p99 {p99 * 1000:.1f} мс, макс. {lags[-1] * 1000:.1f} мс"
+            )
+        else:
+            lines.append("Задержка event loop: замеров ещё нет")
+
+        handlers = sorted(self._handlers.items(), key=lambda item: item[1][1], reverse=True)
+        lines.append("")
+        lines.append("Обработчики (по суммарному времени):" if handlers else "Обработчики: вызовов ещё не было")
+        for name, (count, wall, wall_max, cpu, cpu_max, blocking) in handlers[:_REPORT_HANDLERS]:
+            lines.append(
+                f"  {name}: вызовов {count:.0f}, время ср. {wall / count:.2f} / макс. {wall_max:.2f} с, "
+                f"CPU ср. {cpu / count * 1000:.1f} / макс. {cpu_max * 1000:.1f} мс, "
+                f"блокирующих шагов {blocking:.0f}"
+            )
+
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)
+        lines.append("")
+        lines.append("Блокировки event loop (сэмплы стека):" if stacks else "Блокировок event loop не было")
+        period = self._threshold / 2
+        for (name, stack), samples in stacks[:_REPORT_STACKS]:
+            lines.append(f"  {samples} сэмпл. (~{samples * period:.2f} с), обработчик: {name}")
+            lines.append(stack.rstrip("\n"))
+        return "\n".join(lines)
+
+    @types.coroutine
+    def _profiled(
+        self, coro: Coroutine[Any, Any, Any], name: str, cpu: list[float],
+    ) -> Generator[Any, Any, Any]:
+        """Выполняет корутину обработчика по шагам: CPU и блокирующие шаги считаются только для неё."""
+        value: Any = None
+        error: BaseException | None = None
+        while True:
+            self._running = name
+            started, cpu_started = time.monotonic(), time.thread_time()
+            try:
+                future = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._running = None
+                cpu[0] += time.thread_time() - cpu_started
+                step = time.monotonic() - started
+                if step >= self._threshold:
+                    self._handlers.setdefault(name, [0.0] * 6)[5] += 1
+                    logger.warning("Обработчик %s держал event loop %.3f с без await", name, step)
+            try:
+                value, error = (yield future), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+
+    def _record(self, name: str, wall: float, cpu: float) -> None:
+        stats = self._handlers.setdefault(name, [0.0] * 6)
+        stats[0] += 1
+        stats[1] += wall
+        stats[2] = max(stats[2], wall)
+        stats[3] += cpu
+        stats[4] = max(stats[4], cpu)
+
+    async def _measure_lag(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self._interval)
+            lag = max(0.0, time.monotonic() - started - self._interval)
+            self._lags.append(lag)
+            metrics.observe("event_loop_lag_seconds", lag)
+
+    def _watch(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Сторожевой поток: пока отметка в цикле не выполнена дольше порога — сэмплы стека его потока.
+
+        Отметка своя, а не сон замера задержки: блокировка внутри интервала замера тоже видна.
+        """
+        sent = self._beat = time.monotonic()
+        logged = 0.0
+        while not self._stopped.wait(self._threshold / 2):
+            if self._beat >= sent:
+                sent = time.monotonic()
+                try:
+                    loop.call_soon_threadsafe(self._heartbeat)
+                except RuntimeError:
+                    # Цикл уже закрыт
+                    return
+                continue
+            stalled = time.monotonic() - sent
+            if stalled < self._threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=_STACK_DEPTH))
+            name = self._running or "—"
+            with self._lock:
+                self._stacks[(name, stack)] = self._stacks.get((name, stack), 0) + 1
+            if sent != logged:
+                logged = sent
+                logger.warning("Event loop не отвечает %.2f с, обработчик: %s\n%s", stalled, name, stack)
+
+    def _heartbeat(self) -> None:
+        self._beat = time.monotonic()
+
+    def _dump(self) -> None:
+        logger.warning("Отчёт диагностики event loop\n%s", self.report())
+
+    async def _on_diag_command(self, message: Message) -> None:
+        logger.info("chat_id=%s — команда /diag", message.chat.id)
+        text = self._title + self.report()
+        if len(text) > _TELEGRAM_TEXT_LIMIT:
+            text = text[:_TELEGRAM_TEXT_LIMIT] + "\n…"
+        await message.answer(text)
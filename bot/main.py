@@ -1,10 +1,13 @@
 import asyncio
 
-from bot.bot import Bot
 from bot.config import Config
 
 
 def main() -> None:
+    # Импорт здесь, а не в начале модуля: процессы пула картинок заново импортируют главный модуль
+    # (multiprocessing), и им не нужны aiogram, openai и gspread
+    from bot.bot import Bot
+
     config = Config()
     config.setup_logging()
 
@@ -0,0 +1,54 @@
+import logging
+import time
+from collections import OrderedDict
+
+from bot.chat_state import ChatState
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStateStore:
+    """Состояние диалогов в памяти процесса: LRU по числу чатов + вытеснение неактивных по TTL.
+
+    Записи хранятся в компактном сериализованном виде, размер каждой ограничен.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._max_chats = config.state_max_chats
+        self._ttl = config.state_ttl
+        self._max_chat_bytes = config.state_max_chat_bytes
+        self._records: OrderedDict[int, tuple[float, str]] = OrderedDict()
+
+    async def load(self, chat_id: int) -> ChatState:
+        entry = self._records.get(chat_id)
+        if entry is None:
+            return ChatState()
+        updated_at, data = entry
+        if time.monotonic() - updated_at > self._ttl:
+            del self._records[chat_id]
+            return ChatState()
+        return ChatState.from_json(data)
+
+    async def save(self, chat_id: int, state: ChatState) -> None:
+        self._records.pop(chat_id, None)
+        self._records[chat_id] = (time.monotonic(), state.to_json(self._max_chat_bytes))
+        self._evict()
+
+    async def delete(self, chat_id: int) -> None:
+        self._records.pop(chat_id, None)
+
+    async def close(self) -> None:
+        self._records.clear()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _evict(self) -> None:
+        # Записи упорядочены по времени последнего сохранения — самые старые в начале
+        now = time.monotonic()
+        while self._records:
+            updated_at, _ = next(iter(self._records.values()))
+            if len(self._records) <= self._max_chats and now - updated_at <= self._ttl:
+                break
+            self._records.popitem(last=False)
@@ -0,0 +1,100 @@
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+# Границы корзин гистограмм по умолчанию: задержки в секундах
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+TOKENS_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Metrics:
+    """Реестр метрик в текстовом формате Prometheus: гистограммы и gauge.
+
+    Один экземпляр на процесс — модульная переменная metrics. Запись потокобезопасна
+    (гистограммы пишутся и из потоков ввода-вывода Google).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._buckets: dict[str, tuple[float, ...]] = {}
+        self._histograms: dict[str, dict[Labels, list[float]]] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self._help[name] = ("histogram", help_text)
+        self._buckets[name] = buckets
+        self._histograms.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        """Gauge вычисляется при каждом запросе /metrics функцией read."""
+        self._help[name] = ("gauge", help_text)
+        self._gauges[name] = read
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = self._labels(labels)
+        buckets = self._buckets[name]
+        with self._lock:
+            series = self._histograms[name]
+            # Счётчики по корзинам, затем сумма и количество
+            values = series.setdefault(key, [0.0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, (kind, help_text) in self._help.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for key, values in self._histograms[name].items():
+                        for bound, count in zip(self._buckets[name], values):
+                            lines.append(f"{name}_bucket{self._format(key, le=f'{bound:g}')} {count:g}")
+                        lines.append(f"{name}_bucket{self._format(key, le='+Inf')} {values[-1]:g}")
+                        lines.append(f"{name}_sum{self._format(key)} {values[-2]:g}")
+                        lines.append(f"{name}_count{self._format(key)} {values[-1]:g}")
+                else:
+                    value = self._gauges[name]()
+                    lines.append(f"{name} {value:g}" if math.isfinite(value) else f"{name} NaN")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels: dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def _format(key: Labels, **extra: str) -> str:
+        pairs = list(key) + list(extra.items())
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{v}"' for k, v in pairs)
+        return "{" + body + "}"
+
+
+metrics = Metrics()
+
+metrics.histogram("llm_request_seconds", "Длительность попытки запроса к LLM")
+metrics.histogram("llm_tokens", "Токенов на запрос к LLM", TOKENS_BUCKETS)
+metrics.histogram("drive_download_seconds", "Длительность загрузки файла с Google Drive")
+metrics.histogram("drive_download_bytes", "Размер загруженного с Google Drive файла", BYTES_BUCKETS)
+metrics.histogram("sheets_write_seconds", "Длительность записи заявок в Google Sheets")
+metrics.histogram("handler_seconds", "Полное время обработки апдейта по точке входа")
+metrics.histogram("event_loop_lag_seconds", "Задержка event loop (при DIAGNOSTICS_ENABLED)", LAG_BUCKETS)
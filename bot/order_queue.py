@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from pathlib import Path
+
+from bot.config import Config
+from bot.order_writer import OrderWriter
+
+logger = logging.getLogger(__name__)
+
+_SPOOL_NAME = "orders_spool.jsonl"
+
+
+class OrderQueue:
+    """Очередь заявок: сначала запись в локальный журнал (JSONL), затем пакетная запись в Google Sheets.
+
+    Заявки, которые не удалось записать (недоступен API, перезапуск), остаются в журнале
+    и дописываются при следующей попытке или после старта бота. Журналы, оставшиеся после смены
+    BOT_WORKERS (общий в data_dir или лишних обработчиков), переносит к себе при старте один процесс —
+    единственный или обработчик 0.
+    """
+
+    def __init__(self, config: Config, order_writer: OrderWriter) -> None:
+        self._order_writer = order_writer
+        self._spool_path: Path = config.process_data_dir / _SPOOL_NAME
+        self._data_dir = config.data_dir
+        self._worker_index = config.worker_index
+        self._workers = config.bot_workers
+        self._batch_window = config.order_batch_window
+        self._batch_size = config.order_batch_size
+        self._retry_base_delay = config.order_retry_base_delay
+        self._retry_max_delay = config.order_retry_max_delay
+        self._pending: list[dict] = []
+        self._has_pending = asyncio.Event()
+        self._spool_lock = asyncio.Lock()
+        self._worker: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._pending = await asyncio.to_thread(self._load_spool)
+        if self._pending:
+            logger.info("В журнале заявок найдено незаписанных: %d", len(self._pending))
+            self._has_pending.set()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._pending:
+            logger.warning("Остались незаписанные заявки (%d), они сохранены в журнале", len(self._pending))
+
+    async def submit(self, row: list[str]) -> None:
+        """Сохраняет заявку в журнал и ставит в очередь на запись. Ошибка — только если не удалось сохранить локально."""
+        record = {"id": uuid.uuid4().hex, "row": row}
+        async with self._spool_lock:
+            await asyncio.to_thread(self._append_spool, record)
+            self._pending.append(record)
+        self._has_pending.set()
+
+    async def _run(self) -> None:
+        attempt = 0
+        while True:
+            await self._has_pending.wait()
+            # Небольшое окно, чтобы собрать заявки, пришедшие почти одновременно
+            await asyncio.sleep(self._batch_window)
+            batch = self._pending[: self._batch_size]
+            try:
+                await asyncio.to_thread(
+                    self._order_writer.append_rows, [record["row"] for record in batch],
+                )
+            except Exception:
+                attempt += 1
+                delay = self._retry_delay(attempt)
+                logger.exception(
+                    "Ошибка записи заявок (%d шт.), попытка %d, повтор через %.1f с",
+                    len(batch), attempt, delay,
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            attempt = 0
+            done = {record["id"] for record in batch}
+            async with self._spool_lock:
+                self._pending = [r for r in self._pending if r["id"] not in done]
+            await self._compact_spool()
+
+    async def _compact_spool(self) -> None:
+        """Убирает из журнала записанные заявки; при ошибке диска (нет места, прав) — повтор с задержкой."""
+        attempt = 0
+        while True:
+            async with self._spool_lock:
+                try:
+                    await asyncio.to_thread(self._rewrite_spool, list(self._pending))
+                except OSError:
+                    attempt += 1
+                    delay = self._retry_delay(attempt)
+                    logger.exception(
+                        "Ошибка перезаписи журнала заявок, попытка %d, повтор через %.1f с", attempt, delay,
+                    )
+                else:
+                    if not self._pending:
+                        self._has_pending.clear()
+                    return
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, attempt: int) -> float:
+        delay = min(self._retry_max_delay, self._retry_base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _load_spool(self) -> list[dict]:
+        records = self._read_spool(self._spool_path)
+        for path in self._orphan_spools():
+            known = {record["id"] for record in records}
+            adopted = [record for record in self._read_spool(path) if record["id"] not in known]
+            records.extend(adopted)
+            # Сначала свой журнал с перенесёнными заявками, потом удаление старого: сбой между ними
+            # даст повторный перенос при следующем старте, дубли отсекаются по id
+            self._rewrite_spool(records)
+            path.unlink()
+            logger.info("Журнал заявок %s перенесён, заявок: %d", path, len(adopted))
+        return records
+
+    def _orphan_spools(self) -> list[Path]:
+        """Журналы других раскладок data_dir, которые больше никто не прочитает."""
+        if self._worker_index is None:
+            return sorted(self._data_dir.glob(f"worker-*/{_SPOOL_NAME}"))
+        if self._worker_index != 0:
+            return []
+        paths = [self._data_dir / _SPOOL_NAME]
+        for path in sorted(self._data_dir.glob(f"worker-*/{_SPOOL_NAME}")):
+            index = path.parent.name.removeprefix("worker-")
+            if index.isdigit() and int(index) >= self._workers:
+                paths.append(path)
+        return [path for path in paths if path.exists()]
+
+    def _read_spool(self, path: Path) -> list[dict]:
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return []
+        records: list[dict] = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Повреждённая строка в журнале заявок пропущена: %s", line[:100])
+        return records
+
+    def _append_spool(self, record: dict) -> None:
+        self._spool_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._spool_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_spool(self, records: list[dict]) -> None:
+        self._spool_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._spool_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._spool_path)
@@ -2,9 +2,12 @@ import logging
 from datetime import datetime
 
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
 
 from bot.config import Config
+from bot.google_api_redirect_adapter import GoogleApiRedirectAdapter
+from bot.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -15,18 +18,23 @@ SCOPES = [
 
 class OrderWriter:
     def __init__(self, config: Config) -> None:
-        creds = Credentials.from_service_account_file(
-            str(config.service_account_path), scopes=SCOPES,
+        creds = Credentials.from_service_account_info(
+            config.service_account_info, scopes=SCOPES,
         )
-        gc = gspread.authorize(creds)
-        sheet = gc.open_by_url(config.google_sheets_orders_url)
-        self._worksheet = sheet.sheet1
+        session = AuthorizedSession(creds)
+        if config.google_api_base_url:
+            session.mount("https://", GoogleApiRedirectAdapter(config.google_api_base_url))
+        self._gc = gspread.authorize(creds, session=session)
+        self._orders_url = config.google_sheets_orders_url
+        # Лист открывается при первой записи — запуск бота не ждёт лишних запросов к Google
+        self._worksheet: gspread.Worksheet | None = None
 
-    def write(
-        self, client_name: str, email: str, service: str,
+    @staticmethod
+    def build_row(
+        client_name: str, email: str, service: str,
         comment: str, telegram_id: str, chat_id: int,
-    ) -> None:
-        row = [
+    ) -> list[str]:
+        return [
             datetime.now().strftime("%Y-%m-%d %H:%M"),
             client_name,
             email,
@@ -35,6 +43,11 @@ class OrderWriter:
             service,
             comment,
         ]
-        next_row = len(self._worksheet.get_all_values()) + 1
-        self._worksheet.update(f"A{next_row}", [row])
-        logger.info("Заявка записана: %s — %s", client_name, service)
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        """Дописывает строки в конец таблицы одним запросом (без чтения всего листа)."""
+        with metrics.timer("sheets_write_seconds"):
+            if self._worksheet is None:
+                self._worksheet = self._gc.open_by_url(self._orders_url).sheet1
+            self._worksheet.append_rows(rows, table_range="A1")
+        logger.info("Заявки записаны, строк: %d", len(rows))
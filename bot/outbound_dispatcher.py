@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, SendChatAction, TelegramMethod
+
+from bot.config import Config
+from bot.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты очереди: ответы пользователям раньше служебных уведомлений
+_PRIORITY_INTERACTIVE = 0
+_PRIORITY_NOTIFY = 1
+# С какого числа корзин чатов удалять простаивающие
+_PRUNE_THRESHOLD = 1000
+
+
+class OutboundDispatcher(BaseRequestMiddleware):
+    """Middleware сессии aiogram: все исходящие сообщения проходят через лимиты Telegram.
+
+    Корзина на чат и общая корзина на бота; общую очередь ответы пользователям
+    проходят раньше уведомлений в TELEGRAM_NOTIFY_CHAT_ID. На 429 запрос
+    повторяется после retry_after, чат на это время ставится на паузу.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._chat_rate = config.telegram_chat_rate
+        self._chat_burst = config.telegram_chat_burst
+        self._max_retries = config.telegram_max_retries
+        self._notify_chat_id = config.telegram_notify_chat_id
+        self._global = TokenBucket(config.telegram_global_rate, config.telegram_global_rate)
+        self._chats: dict[Any, TokenBucket] = {}
+        self._queue: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._waiting_chat = 0
+        self.retries_total = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Запросов, ожидающих лимита (чата или общего)."""
+        return self._waiting_chat + len(self._queue)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        chat_id = getattr(method, "chat_id", None)
+        # Служебные запросы (getUpdates, answerCallbackQuery) и «печатает…» не ограничиваются
+        if chat_id is None or isinstance(method, SendChatAction):
+            return await make_request(bot, method)
+
+        priority = _PRIORITY_NOTIFY if chat_id == self._notify_chat_id else _PRIORITY_INTERACTIVE
+        for attempt in range(self._max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self._max_retries:
+                    raise
+                self.retries_total += 1
+                logger.warning(
+                    "Telegram: лимит для chat_id=%s, повтор через %d с (очередь: %d)",
+                    chat_id, e.retry_after, self.queue_depth,
+                )
+                self._chat_bucket(chat_id).pause(e.retry_after)
+        raise AssertionError("unreachable")
+
+    async def _acquire(self, chat_id: Any, priority: int) -> None:
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay > 0:
+            self._waiting_chat += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._waiting_chat -= 1
+        await self._acquire_global(priority)
+
+    async def _acquire_global(self, priority: int) -> None:
+        """Общий лимит: токен получает голова очереди (меньший приоритет, затем порядок прихода)."""
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                changed = self._changed
+                if self._queue[0] == ticket:
+                    delay = self._global.wait_time()
+                    if delay <= 0:
+                        self._global.take()
+                        return
+                else:
+                    delay = None
+                try:
+                    await asyncio.wait_for(changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _PRUNE_THRESHOLD:
+                self._chats = {k: b for k, b in self._chats.items() if not b.full}
+            bucket = TokenBucket(self._chat_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
@@ -1,4 +1,5 @@
 import logging
+from typing import Any
 
 logger = logging.getLogger(__name__)
 
@@ -29,17 +30,32 @@ ORDER_INSTRUCTION = """
 Блок [order] отправляй ТОЛЬКО после явного подтверждения клиента.
 """.strip()
 
+SUMMARY_PREFIX = "Краткое содержание предыдущей части диалога с клиентом:"
+
 
 class Prompt:
-    def __init__(self, system_prompt: str, services_text: str = "") -> None:
-        self._system_prompt = system_prompt
-        self._services_text = services_text
-
-    def build(self, history: list[dict[str, str]]) -> list[dict[str, str]]:
-        parts = [self._system_prompt]
-        if self._services_text:
-            parts.append(self._services_text)
+    def __init__(
+        self, system_prompt: str, services_text: str = "", cache_control: bool = False,
+    ) -> None:
+        # Системное сообщение собирается один раз: одинаковый префикс запроса
+        # позволяет провайдеру брать его из кеша
+        parts = [system_prompt]
+        if services_text:
+            parts.append(services_text)
         parts.append(BUTTONS_INSTRUCTION)
         parts.append(ORDER_INSTRUCTION)
         full_system = "\n\n".join(parts)
-        return [{"role": "system", "content": full_system}, *history]
+        content: str | list[dict[str, Any]] = full_system
+        if cache_control:
+            # Явная разметка кеша для провайдеров, которые её поддерживают (Anthropic, Gemini через OpenRouter)
+            content = [{"type": "text", "text": full_system, "cache_control": {"type": "ephemeral"}}]
+        self._system_message: dict[str, Any] = {"role": "system", "content": content}
+
+    def build(
+        self, history: list[dict[str, str]], summary: str = "",
+    ) -> list[dict[str, Any]]:
+        messages = [self._system_message]
+        if summary:
+            # Сводка идёт отдельным сообщением после системного промта, чтобы не менять его текст
+            messages.append({"role": "system", "content": f"{SUMMARY_PREFIX}\n{summary}"})
+        return [*messages, *history]
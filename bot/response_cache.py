@@ -0,0 +1,65 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Кеш ответов LLM для одинаковых запросов (приветствие, кнопки в начале диалога).
+
+    Ключ — хеш полного списка сообщений и модели, поэтому ответ переиспользуется
+    только при совпадении промта и истории. Вытеснение — по TTL и LRU.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._ttl = config.response_cache_ttl
+        self._max_size = config.response_cache_max_size
+        self._items: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0 and self._max_size > 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @staticmethod
+    def key(messages: list[dict[str, Any]], model: str) -> str:
+        payload = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        entry = self._items.get(key)
+        if entry is None or time.monotonic() > entry[0]:
+            self._items.pop(key, None)
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, answer: str) -> None:
+        if not self.enabled:
+            return
+        self._items[key] = (time.monotonic() + self._ttl, answer)
+        self._items.move_to_end(key)
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        if self._items:
+            logger.info("Кеш ответов LLM очищен, записей: %d", len(self._items))
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
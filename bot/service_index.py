@@ -0,0 +1,71 @@
+import re
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+class ServiceIndex:
+    """Индекс услуг по названию: автомат Ахо — Корасик по нормализованным названиям.
+
+    Поиск всех названий, входящих в текст, — за один проход по тексту, независимо от числа услуг.
+    Строится целиком при загрузке услуг и после этого не меняется.
+    """
+
+    def __init__(self, services: list[dict[str, str]]) -> None:
+        self.services = services
+        self._patterns: list[tuple[str, dict[str, str]]] = []
+        # Узлы автомата: переходы, суффиксная ссылка, индексы названий, заканчивающихся в узле
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+        for service in services:
+            name = self.normalize(str(service.get("Название", "")))
+            if name:
+                self._add(name, service)
+        self._build_links()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return _SPACES_RE.sub(" ", text.lower().replace("ё", "е")).strip()
+
+    def matches(self, text: str) -> list[dict[str, str]]:
+        """Услуги, чьи названия входят в text; более длинные (точные) названия — первыми."""
+        found: set[int] = set()
+        node = 0
+        for char in self.normalize(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            found.update(self._out[node])
+        ordered = sorted(found, key=lambda i: len(self._patterns[i][0]), reverse=True)
+        return [self._patterns[i][1] for i in ordered]
+
+    def find(self, text: str) -> dict[str, str] | None:
+        """Услуга с самым длинным названием, входящим в text."""
+        found = self.matches(text)
+        return found[0] if found else None
+
+    def _add(self, name: str, service: dict[str, str]) -> None:
+        node = 0
+        for char in name:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append(len(self._patterns))
+        self._patterns.append((name, service))
+
+    def _build_links(self) -> None:
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(char, 0)
+                self._fail[child] = candidate if candidate != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
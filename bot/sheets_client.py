@@ -1,11 +1,25 @@
+import asyncio
+import functools
 import logging
 import re
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
 
 import gspread
+import requests
+from google.auth.exceptions import TransportError
 from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
 
 from bot.config import Config
+from bot.drive_cache import DriveCache
+from bot.drive_file import DriveFile
+from bot.google_api_redirect_adapter import GoogleApiRedirectAdapter
+from bot.image_processor import ImageProcessor
+from bot.metrics import metrics
+from bot.service_index import ServiceIndex
 
 logger = logging.getLogger(__name__)
 
@@ -17,25 +31,89 @@ SCOPES = [
 _DOC_ID_RE = re.compile(r"/document/d/([a-zA-Z0-9_-]+)")
 _DRIVE_ID_RE = re.compile(r"(?:/d/|/folders/|id=)([a-zA-Z0-9_-]+)")
 
+_DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+_FILE_FIELDS = "id,name,mimeType,md5Checksum,modifiedTime"
+
+T = TypeVar("T")
+
+# Таймаут запроса и сетевые ошибки (в том числе при обновлении токена Google)
+_DOWNLOAD_ERRORS = (requests.RequestException, TransportError, asyncio.TimeoutError)
+
 
 class SheetsClient:
     def __init__(self, config: Config) -> None:
-        creds = Credentials.from_service_account_file(
-            str(config.service_account_path), scopes=SCOPES,
+        creds = Credentials.from_service_account_info(
+            config.service_account_info, scopes=SCOPES,
         )
-        self._gc = gspread.authorize(creds)
         self._authed_session = AuthorizedSession(creds)
+        # Пул соединений по числу потоков, чтобы параллельные загрузки не ждали сокет
+        pool = {
+            "pool_connections": config.google_io_workers,
+            "pool_maxsize": config.google_io_workers,
+        }
+        adapter: HTTPAdapter
+        if config.google_api_base_url:
+            adapter = GoogleApiRedirectAdapter(config.google_api_base_url, **pool)
+        else:
+            adapter = HTTPAdapter(**pool)
+        self._authed_session.mount("https://", adapter)
+        # gspread работает через ту же сессию и пул соединений
+        self._gc = gspread.authorize(creds, session=self._authed_session)
+        # Синхронный HTTP к Google выполняется в отдельных потоках, а не в event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.google_io_workers, thread_name_prefix="google-io",
+        )
+        self._cache = DriveCache(config)
+        # Идущие запросы к Drive по ключу кеша: одновременные промахи (описание и картинки примеров,
+        # приветствие и PDF согласия у нескольких чатов) ждут один запрос
+        self._inflight: dict[str, asyncio.Task[Any]] = {}
+        self._image_processor = ImageProcessor(config)
+        # Одновременных загрузок с Drive на процесс и таймаут одного запроса
+        self._download_semaphore = asyncio.Semaphore(config.google_download_concurrency)
+        self._request_timeout = config.google_request_timeout
         self._services_url = config.google_sheets_services_url
         self._prompt_doc_url = config.google_doc_prompt_url
-        self.services: list[dict[str, str]] = []
+        self._index = ServiceIndex([])
+
+    @property
+    def services(self) -> list[dict[str, str]]:
+        return self._index.services
+
+    @services.setter
+    def services(self, services: list[dict[str, str]]) -> None:
+        # Индекс строится заранее и подменяется одной операцией — поиск всегда видит целостные данные
+        self._index = ServiceIndex(services)
+
+    async def fetch_content(self) -> tuple[list[dict[str, str]], str]:
+        """Услуги и системный промт, загруженные параллельно; кеш услуг при этом не меняется."""
+        services, prompt = await asyncio.gather(
+            self._run(self._fetch_services), self._run(self.load_prompt),
+        )
+        return services, prompt
+
+    async def content_versions(self) -> tuple[str, str]:
+        """modifiedTime таблицы услуг и документа с промтом — дешёвая проверка, изменились ли они."""
+        services, prompt = await asyncio.gather(
+            self._modified_time(self._services_url), self._modified_time(self._prompt_doc_url),
+        )
+        # Кортеж, а не list из gather: сравнивается с версиями из снимка
+        return services, prompt
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        return self._cache.hit_ratio
 
-    def load_services(self) -> None:
+    def clear_metadata_cache(self) -> None:
+        self._cache.clear_meta()
+
+    def _fetch_services(self) -> list[dict[str, str]]:
         logger.info("Загрузка услуг из Google Sheets...")
         sheet = self._gc.open_by_url(self._services_url)
         worksheet = sheet.sheet1
         rows = worksheet.get_all_records()
-        self.services = [dict(row) for row in rows]
-        logger.info("Загружено услуг: %d", len(self.services))
+        services = [dict(row) for row in rows]
+        logger.info("Загружено услуг: %d", len(services))
+        return services
 
     def format_services_for_prompt(self) -> str:
         if not self.services:
@@ -69,69 +147,214 @@ class SheetsClient:
         logger.info("Системный промт загружен, длина: %d символов", len(text))
         return text
 
+    def find_service(self, text: str) -> dict[str, str] | None:
+        """Услуга, чьё название входит в text (самое длинное из подходящих)."""
+        return self._index.find(text)
+
     def find_example_url(self, service_name: str) -> str | None:
-        for s in self.services:
-            name = str(s.get("Название", ""))
+        for s in self._index.matches(service_name):
             url = str(s.get("Пример (ссылка)", ""))
-            if name and url and name.lower() in service_name.lower():
+            if url:
                 return url
         return None
 
-    def download_examples(self, drive_url: str) -> tuple[str, list[bytes]]:
+    async def download_examples(self, drive_url: str) -> list[DriveFile]:
+        """Картинки из папки примеров или один файл по ссылке; описание — example_description.
+
+        Таймаут или сетевая ошибка — пустой список: вызывающий отвечает без файла.
+        """
         match = _DRIVE_ID_RE.search(drive_url)
         if not match:
             logger.warning("Не удалось извлечь ID из URL: %s", drive_url)
-            return "", []
+            return []
 
         drive_id = match.group(1)
         is_folder = "/folders/" in drive_url
 
-        if is_folder:
-            return self._download_folder_examples(drive_id)
+        try:
+            if is_folder:
+                return await self._download_folder_images(drive_id)
+            meta = await self._get_metadata(drive_id)
+            if meta is None:
+                return []
+            file = await self._download_file(meta)
+        except _DOWNLOAD_ERRORS as e:
+            logger.warning("Не удалось загрузить %s: %r", drive_url, e)
+            return []
+        return [file] if file else []
+
+    async def example_description(self, drive_url: str) -> tuple[str, str]:
+        """Ключ версии (ID:ревизия) и текст документа-описания из папки примеров; ("", "") — описания нет
+        или его не удалось загрузить."""
+        match = _DRIVE_ID_RE.search(drive_url)
+        if not match or "/folders/" not in drive_url:
+            return "", ""
+        try:
+            files = await self._list_folder(match.group(1))
+            if not files:
+                return "", ""
+            # Описание — первый по имени документ папки
+            docs = sorted(
+                (f for f in files if f.get("mimeType") == "application/vnd.google-apps.document"),
+                key=lambda f: (f.get("name", ""), f["id"]),
+            )
+            if not docs:
+                return "", ""
+            text = await self._export_doc_as_text(docs[0])
+        except _DOWNLOAD_ERRORS as e:
+            logger.warning("Не удалось загрузить описание примеров %s: %r", drive_url, e)
+            return "", ""
+        return (DriveCache.key(docs[0]), text) if text else ("", "")
+
+    def start(self) -> None:
+        self._image_processor.start()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._image_processor.close()
+        self._authed_session.close()
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _get(self, url: str) -> requests.Response:
+        get = functools.partial(self._authed_session.get, url, timeout=self._request_timeout)
+        return await self._run(get)
 
-        data = self._download_file(drive_id)
-        return "", [data] if data else []
+    async def _modified_time(self, url: str) -> str:
+        match = _DRIVE_ID_RE.search(url)
+        if not match:
+            raise RuntimeError(f"Не удалось извлечь ID из URL: {url}")
+        response = await self._get(f"{_DRIVE_FILES_URL}/{match.group(1)}?fields=modifiedTime")
+        response.raise_for_status()
+        return response.json().get("modifiedTime", "")
+
+    async def _shared(self, key: str, load: Callable[[], Awaitable[T]]) -> T:
+        """Результат load; одновременные вызовы с тем же ключом ждут одну общую задачу."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(load())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Отмена одного ожидающего не прерывает запрос для остальных
+        return await asyncio.shield(task)
 
-    def _download_folder_examples(self, folder_id: str) -> tuple[str, list[bytes]]:
+    async def _get_metadata(self, file_id: str) -> dict[str, str] | None:
+        cached = self._cache.get_meta(f"file:{file_id}")
+        if cached is not None:
+            return cached
+        return await self._shared(f"file:{file_id}", lambda: self._fetch_metadata(file_id))
+
+    async def _fetch_metadata(self, file_id: str) -> dict[str, str] | None:
+        response = await self._get(f"{_DRIVE_FILES_URL}/{file_id}?fields={_FILE_FIELDS}")
+        if response.status_code != 200:
+            logger.warning("Не удалось получить метаданные файла %s: %s", file_id, response.status_code)
+            return None
+        meta = response.json()
+        self._cache.put_meta(f"file:{file_id}", meta)
+        return meta
+
+    async def _list_folder(self, folder_id: str) -> list[dict[str, str]] | None:
+        cached = self._cache.get_meta(f"folder:{folder_id}")
+        if cached is not None:
+            return cached
+        return await self._shared(f"folder:{folder_id}", lambda: self._fetch_folder_listing(folder_id))
+
+    async def _fetch_folder_listing(self, folder_id: str) -> list[dict[str, str]] | None:
         list_url = (
-            f"https://www.googleapis.com/drive/v3/files"
+            f"{_DRIVE_FILES_URL}"
             f"?q='{folder_id}'+in+parents"
-            f"&fields=files(id,name,mimeType)"
+            f"&fields=files({_FILE_FIELDS})"
         )
-        response = self._authed_session.get(list_url)
+        response = await self._get(list_url)
         if response.status_code != 200:
             logger.warning("Не удалось получить список файлов папки: %s", response.status_code)
-            return "", []
-
+            return None
         files = response.json().get("files", [])
+        self._cache.put_meta(f"folder:{folder_id}", files)
+        return files
 
-        description = ""
-        images: list[bytes] = []
-        for f in files:
-            mime = f.get("mimeType", "")
-            if mime == "application/vnd.google-apps.document":
-                description = self._export_doc_as_text(f["id"])
-            elif mime.startswith("image/"):
-                data = self._download_file(f["id"])
-                if data:
-                    images.append(data)
-
-        logger.info("В папке: описание=%s, картинок=%d", bool(description), len(images))
-        return description, images
-
-    def _export_doc_as_text(self, doc_id: str) -> str:
-        url = f"https://docs.google.com/document/d/{doc_id}/export?format=txt"
-        response = self._authed_session.get(url)
-        if response.status_code != 200:
-            logger.warning("Не удалось экспортировать документ %s: %s", doc_id, response.status_code)
+    async def _download_folder_images(self, folder_id: str) -> list[DriveFile]:
+        files = await self._list_folder(folder_id)
+        if files is None:
+            return []
+
+        # Порядок по имени файла — чтобы альбом всегда собирался одинаково
+        files = sorted(files, key=lambda f: (f.get("name", ""), f["id"]))
+        image_files = [f for f in files if f.get("mimeType", "").startswith("image/")]
+
+        # Все картинки папки загружаются параллельно; ошибка одной не мешает остальным
+        results = await asyncio.gather(
+            *(self._download_file(f) for f in image_files), return_exceptions=True,
+        )
+        for f, result in zip(image_files, results):
+            if isinstance(result, BaseException):
+                logger.warning("Не удалось загрузить файл %s: %r", f["id"], result)
+        images = [r for r in results if isinstance(r, DriveFile)]
+
+        logger.info("В папке картинок: %d", len(images))
+        return images
+
+    async def _cached_bytes(
+        self, key: str, url: str,
+        transform: Callable[[bytes], Awaitable[bytes]] | None = None,
+    ) -> bytes | None:
+        """Содержимое по ключу кеша: память → диск → запрос к Google (с сохранением в кеш).
+
+        transform — обработка скачанного перед сохранением; в кеш попадает уже результат.
+        Одновременные промахи по ключу скачивают и обрабатывают файл один раз.
+        """
+        data = self._cache.get(key)
+        if data is not None:
+            return data
+        return await self._shared(f"bytes:{key}", lambda: self._load_bytes(key, url, transform))
+
+    async def _load_bytes(
+        self, key: str, url: str,
+        transform: Callable[[bytes], Awaitable[bytes]] | None,
+    ) -> bytes | None:
+        data = await self._run(self._cache.read_disk, key)
+        if data is None:
+            async with self._download_semaphore:
+                with metrics.timer("drive_download_seconds"):
+                    response = await asyncio.wait_for(self._get(url), self._request_timeout)
+            if response.status_code != 200:
+                logger.warning("Не удалось скачать %s: %s", url, response.status_code)
+                return None
+            data = response.content
+            logger.info("Файл скачан, размер: %d байт", len(data))
+            metrics.observe("drive_download_bytes", len(data))
+            if transform is not None:
+                data = await transform(data)
+            await self._run(self._cache.write_disk, key, data)
+        self._cache.put(key, data)
+        return data
+
+    async def _export_doc_as_text(self, meta: dict[str, str]) -> str:
+        url = f"https://docs.google.com/document/d/{meta['id']}/export?format=txt"
+        data = await self._cached_bytes(DriveCache.key(meta), url)
+        if data is None:
             return ""
-        return response.text.strip()
+        return data.decode("utf-8", errors="replace").strip()
 
-    def _download_file(self, file_id: str) -> bytes | None:
-        url = f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
-        response = self._authed_session.get(url)
-        if response.status_code != 200:
-            logger.warning("Не удалось скачать файл %s: %s", file_id, response.status_code)
+    async def _download_file(self, meta: dict[str, str]) -> DriveFile | None:
+        url = f"{_DRIVE_FILES_URL}/{meta['id']}?alt=media"
+        key = DriveCache.key(meta)
+        mime_type = meta.get("mimeType", "")
+        transform = None
+        # Картинки кешируются и отправляются уже уменьшенными и пересжатыми
+        if mime_type.startswith("image/") and self._image_processor.enabled:
+            key = f"{key}|{self._image_processor.variant}"
+            mime_type = self._image_processor.mime_type
+            transform = self._image_processor.process
+        data = await self._cached_bytes(key, url, transform)
+        if data is None:
             return None
-        logger.info("Файл скачан, размер: %d байт", len(response.content))
-        return response.content
+        return DriveFile(
+            id=meta["id"],
+            version=key.partition(":")[2],
+            data=data,
+            name=meta.get("name", ""),
+            mime_type=mime_type,
+        )
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from bot.chat_state import ChatState
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять из базы неактивные чаты, сек
+_CLEANUP_INTERVAL = 3600
+
+T = TypeVar("T")
+
+
+class SqliteStateStore:
+    """Состояние диалогов в SQLite (режим WAL): переживает перезапуск бота.
+
+    Все обращения к базе идут через один отдельный поток, чтобы не блокировать event loop.
+    База может быть общей у нескольких процессов-обработчиков: чат всегда обслуживает один процесс,
+    поэтому свои чаты процесс держит в локальном кеше (LRU) и читает из базы только при промахе.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._ttl = config.state_ttl
+        self._max_chat_bytes = config.state_max_chat_bytes
+        self._cache_size = config.state_max_chats
+        self._cache: OrderedDict[int, tuple[str, float]] = OrderedDict()
+        self._path = config.data_dir / "state.sqlite3"
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-db")
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Другие процессы могут держать блокировку записи — ждём, а не падаем
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_state ("
+            "chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._last_cleanup = 0.0
+        logger.info("Состояние диалогов хранится в %s", self._path)
+
+    async def load(self, chat_id: int) -> ChatState:
+        row = self._cache.get(chat_id)
+        if row is None:
+            row = await self._run(self._select, chat_id)
+            if row is None:
+                return ChatState()
+        self._remember(chat_id, row)
+        data, updated_at = row
+        if time.time() - updated_at > self._ttl:
+            return ChatState()
+        return ChatState.from_json(data)
+
+    async def save(self, chat_id: int, state: ChatState) -> None:
+        data = state.to_json(self._max_chat_bytes)
+        self._remember(chat_id, (data, time.time()))
+        await self._run(self._upsert, chat_id, data)
+
+    async def delete(self, chat_id: int) -> None:
+        self._cache.pop(chat_id, None)
+        await self._run(self._delete, chat_id)
+
+    async def close(self) -> None:
+        self._cache.clear()
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _remember(self, chat_id: int, row: tuple[str, float]) -> None:
+        self._cache[chat_id] = row
+        self._cache.move_to_end(chat_id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _select(self, chat_id: int) -> tuple[str, float] | None:
+        return self._conn.execute(
+            "SELECT data, updated_at FROM chat_state WHERE chat_id = ?", (chat_id,),
+        ).fetchone()
+
+    def _upsert(self, chat_id: int, data: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO chat_state (chat_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (chat_id, data, now),
+        )
+        if now - self._last_cleanup > _CLEANUP_INTERVAL:
+            self._last_cleanup = now
+            deleted = self._conn.execute(
+                "DELETE FROM chat_state WHERE updated_at < ?", (now - self._ttl,),
+            ).rowcount
+            if deleted:
+                logger.info("Удалено неактивных диалогов: %d", deleted)
+
+    def _delete(self, chat_id: int) -> None:
+        self._conn.execute("DELETE FROM chat_state WHERE chat_id = ?", (chat_id,))
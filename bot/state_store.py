@@ -0,0 +1,20 @@
+from typing import Protocol
+
+from bot.chat_state import ChatState
+
+
+class StateStore(Protocol):
+    """Хранилище состояния диалогов по chat_id (реализации: MemoryStateStore, SqliteStateStore)."""
+
+    async def load(self, chat_id: int) -> ChatState:
+        """Состояние чата; для нового или устаревшего чата — пустое."""
+        ...
+
+    async def save(self, chat_id: int, state: ChatState) -> None:
+        ...
+
+    async def delete(self, chat_id: int) -> None:
+        ...
+
+    async def close(self) -> None:
+        ...
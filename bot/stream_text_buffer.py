@@ -0,0 +1,29 @@
+_MARKERS = ("[buttons]", "[order]")
+
+
+class StreamTextBuffer:
+    """Накопитель текста потокового ответа LLM.
+
+    Отдаёт для показа только текст до служебных блоков [buttons] и [order],
+    включая случай, когда маркер ещё не пришёл целиком (например, «[bu»).
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+
+    def feed(self, delta: str) -> None:
+        self.text += delta
+
+    def visible(self) -> str:
+        cut = len(self.text)
+        for marker in _MARKERS:
+            index = self.text.find(marker)
+            if index != -1:
+                cut = min(cut, index)
+        # Незавершённый маркер в конце текста
+        tail_start = self.text.rfind("[", 0, cut)
+        if tail_start != -1:
+            tail = self.text[tail_start:cut]
+            if any(marker.startswith(tail) for marker in _MARKERS):
+                cut = tail_start
+        return self.text[:cut].strip()
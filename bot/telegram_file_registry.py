@@ -0,0 +1,87 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+from bot.config import Config
+from bot.drive_file import DriveFile
+
+logger = logging.getLogger(__name__)
+
+# Задержка записи на диск: новые file_id альбома сохраняются одной записью, сек
+_SAVE_DELAY = 1.0
+
+
+class TelegramFileRegistry:
+    """Соответствие «файл на Drive (ID + версия) → file_id в Telegram», хранится в JSON-файле.
+
+    После первой загрузки Telegram возвращает file_id, по которому тот же файл
+    можно отправлять повторно без передачи байтов. Изменения пишутся на диск в фоне
+    (в отдельном потоке, с задержкой _SAVE_DELAY), чтобы не блокировать event loop.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._path: Path = config.process_data_dir / "telegram_files.json"
+        self._file_ids: dict[str, str] = self._load()
+        self._save_task: asyncio.Task | None = None
+        # Есть изменения, ещё не переданные на запись
+        self._dirty = False
+
+    @staticmethod
+    def key(kind: str, file: DriveFile) -> str:
+        return f"{kind}:{file.id}:{file.version}"
+
+    def get(self, key: str) -> str | None:
+        return self._file_ids.get(key)
+
+    def put(self, key: str, file_id: str) -> None:
+        if self._file_ids.get(key) == file_id:
+            return
+        self._file_ids[key] = file_id
+        self._schedule_save()
+
+    def forget(self, key: str) -> None:
+        if self._file_ids.pop(key, None) is not None:
+            self._schedule_save()
+
+    async def close(self) -> None:
+        """Дожидается отложенной записи на диск, включая изменения, сделанные во время неё."""
+        if self._save_task is not None:
+            await self._save_task
+            self._save_task = None
+
+    def _schedule_save(self) -> None:
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        # Изменения, сделанные во время записи, сохраняются следующим проходом
+        while self._dirty:
+            await asyncio.sleep(_SAVE_DELAY)
+            self._dirty = False
+            # Снимок словаря: поток пишет его, пока event loop продолжает менять реестр
+            await asyncio.to_thread(self._save, dict(self._file_ids))
+
+    def _load(self) -> dict[str, str]:
+        try:
+            with self._path.open(encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.exception("Не удалось прочитать реестр file_id: %s", self._path)
+            return {}
+        logger.info("Реестр file_id загружен, записей: %d", len(data))
+        return dict(data)
+
+    def _save(self, file_ids: dict[str, str]) -> None:
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(file_ids, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self._path)
+        except OSError:
+            logger.exception("Не удалось сохранить реестр file_id: %s", self._path)
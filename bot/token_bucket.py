@@ -0,0 +1,43 @@
+import time
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst накопленных."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self._tokens >= self._burst
+
+    def wait_time(self) -> float:
+        """Сколько ждать следующего токена (0 — есть сейчас)."""
+        self._refill()
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+    def take(self) -> None:
+        self._refill()
+        self._tokens -= 1
+
+    def reserve(self) -> float:
+        """Забирает токен авансом и возвращает, сколько ждать до его появления."""
+        delay = self.wait_time()
+        self._tokens -= 1
+        return delay
+
+    def pause(self, seconds: float) -> None:
+        """Опустошает корзину так, чтобы первый токен появился через seconds."""
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self._rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import aiohttp
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Сколько пытаться доставить апдейт обработчику (перезапускается, ещё не поднялся), сек
+_DELIVERY_TIMEOUT = 60
+_RETRY_MAX_DELAY = 2.0
+# Заголовок с секретом — тот же, что у вебхуков Telegram, его проверяет SimpleRequestHandler
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Команды администратора, которые касаются состояния каждого процесса, — рассылаются всем обработчикам.
+# /diag — только при DIAGNOSTICS_ENABLED: без обработчика команда ушла бы в LLM в каждом процессе
+_BROADCAST_COMMANDS = frozenset({"/reload"})
+
+
+class UpdateRouter(BaseMiddleware):
+    """Внешний middleware маршрутизатора: апдейт не обрабатывается здесь, а пересылается процессу-обработчику.
+
+    Процесс выбирается по chat_id (остаток от деления на BOT_WORKERS), поэтому один чат всегда
+    обслуживает один процесс. У каждого процесса своя очередь, апдейты уходят по одному в порядке
+    получения — порядок сообщений внутри чата сохраняется. /reload (и /diag при DIAGNOSTICS_ENABLED)
+    из чатов администраторов уходят всем обработчикам: каждый отвечает за себя.
+    """
+
+    def __init__(self, config: Config, secret: str) -> None:
+        self._secret = secret
+        self._admin_chat_ids = set(config.admin_chat_ids)
+        self._broadcast_commands = _BROADCAST_COMMANDS | ({"/diag"} if config.diagnostics_enabled else set())
+        self._urls = [
+            f"http://127.0.0.1:{config.worker_base_port + index}/update" for index in range(config.bot_workers)
+        ]
+        self._queues: list[asyncio.Queue[Update]] = [asyncio.Queue() for _ in self._urls]
+        self._session: aiohttp.ClientSession | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def start(self) -> None:
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self._tasks = [asyncio.create_task(self._forward(index)) for index in range(len(self._urls))]
+
+    async def stop(self, timeout: float) -> None:
+        """Ждёт отправки накопившихся апдейтов (не дольше timeout, сек) и закрывает соединения."""
+        if self._session is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не пересланы обработчикам апдейты: %d", self.queue_depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._session.close()
+        self._session = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        assert isinstance(event, Update)
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat is not None else user.id if user is not None else 0
+        if key in self._admin_chat_ids and self._is_broadcast(event):
+            for queue in self._queues:
+                queue.put_nowait(event)
+            return None
+        self._queues[key % len(self._queues)].put_nowait(event)
+        return None
+
+    def _is_broadcast(self, update: Update) -> bool:
+        text = update.message.text if update.message is not None else None
+        if not text or not text.startswith("/"):
+            return False
+        # /diag@имя_бота — та же команда
+        return text.split(maxsplit=1)[0].partition("@")[0] in self._broadcast_commands
+
+    async def _forward(self, index: int) -> None:
+        queue = self._queues[index]
+        while True:
+            update = await queue.get()
+            try:
+                await self._deliver(index, update)
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, index: int, update: Update) -> None:
+        assert self._session is not None
+        body = update.model_dump_json(by_alias=True, exclude_none=True)
+        headers = {_SECRET_HEADER: self._secret, "Content-Type": "application/json"}
+        deadline = time.monotonic() + _DELIVERY_TIMEOUT
+        delay = 0.1
+        while True:
+            try:
+                async with self._session.post(self._urls[index], data=body, headers=headers) as response:
+                    if response.status == 200:
+                        return
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if time.monotonic() + delay > deadline:
+                logger.error(
+                    "Апдейт %s не доставлен обработчику %d: %s", update.update_id, index, error,
+                )
+                return
+            logger.debug("Обработчик %d недоступен (%s), повтор через %.1f с", index, error, delay)
+            await asyncio.sleep(delay)
+            delay = min(_RETRY_MAX_DELAY, delay * 2)
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import sys
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего обработчика, сек
+_RESTART_DELAY = 2
+
+
+class WorkerPool:
+    """Процессы-обработчики (BOT_WORKERS): запуск `python -m bot.main` с номером, перезапуск при падении, остановка.
+
+    Обработчик принимает апдейты от маршрутизатора по HTTP на 127.0.0.1:WORKER_BASE_PORT + номер;
+    секрет для заголовка пересылки генерируется при каждом запуске.
+    """
+
+    def __init__(self, config: Config) -> None:
+        self._count = config.bot_workers
+        self._shutdown_timeout = config.shutdown_timeout
+        self.secret = secrets.token_urlsafe(32)
+        self._processes: dict[int, asyncio.subprocess.Process] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._supervise(index)) for index in range(self._count)]
+        logger.info("Запущено процессов-обработчиков: %d", self._count)
+
+    async def stop(self) -> None:
+        """SIGTERM обработчикам (они дорабатывают начатые апдейты), затем ожидание и принудительное завершение."""
+        self._stopping = True
+        running = [p for p in self._processes.values() if p.returncode is None]
+        for process in running:
+            process.send_signal(signal.SIGTERM)
+        if running:
+            _, pending = await asyncio.wait(
+                [asyncio.create_task(p.wait()) for p in running], timeout=self._shutdown_timeout + 5,
+            )
+            if pending:
+                logger.warning("Обработчики не остановились вовремя (%d), завершаем принудительно", len(pending))
+                killed = [p for p in running if p.returncode is None]
+                for process in killed:
+                    process.kill()
+                await asyncio.gather(*(p.wait() for p in killed))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _supervise(self, index: int) -> None:
+        env = {**os.environ, "BOT_WORKER_INDEX": str(index), "BOT_WORKER_SECRET": self.secret}
+        while True:
+            # Своя группа процессов: Ctrl+C в терминале получает только маршрутизатор, он и останавливает обработчики
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "bot.main", env=env, start_new_session=True,
+            )
+            self._processes[index] = process
+            code = await process.wait()
+            if self._stopping:
+                return
+            logger.error(
+                "Обработчик %d завершился с кодом %s, перезапуск через %d с", index, code, _RESTART_DELAY,
+            )
+            await asyncio.sleep(_RESTART_DELAY)
+            if self._stopping:
+                return